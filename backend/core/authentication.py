@@ -0,0 +1,118 @@
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.utils.functional import cached_property
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from .metrics import record_cache_lookup
+
+TOKEN_USER_CACHE_TTL = getattr(settings, "TOKEN_USER_CACHE_TTL", 30)
+
+
+def user_cache_key(user_id):
+    return f"core:token-user:{user_id}"
+
+
+def get_cached_user(user_id):
+    """
+    The full `CustomUser` (with its company) for a token user, cached for
+    `TOKEN_USER_CACHE_TTL` seconds so repeated requests skip the queries.
+    """
+    key = user_cache_key(user_id)
+    user = cache.get(key)
+    record_cache_lookup("token_user", user is not None)
+    if user is None:
+        try:
+            user = get_user_model().objects.select_related("company").get(pk=user_id)
+        except get_user_model().DoesNotExist:
+            raise AuthenticationFailed("User not found", code="user_not_found")
+        cache.set(key, user, TOKEN_USER_CACHE_TTL)
+    return user
+
+
+def invalidate_cached_user(user_id):
+    """
+    Drop the cached user. `core.signals` calls this whenever a user is
+    saved; with a per-process cache, other processes keep their copy
+    until it expires.
+    """
+    cache.delete(user_cache_key(user_id))
+
+
+class CompanyTokenUser(TokenUser):
+    """
+    `request.user` for JWT requests, built from the access token. Only `id`
+    comes from the token; `role`, `company_id` and every other `CustomUser`
+    attribute come from the full user loaded through `get_cached_user`, so
+    a changed role or company applies within `TOKEN_USER_CACHE_TTL`
+    seconds rather than when the token expires. Code that writes to the
+    user must fetch it from the database.
+    """
+
+    @cached_property
+    def user(self):
+        return get_cached_user(self.id)
+
+    def __getattr__(self, attr):
+        # Only reached for attributes TokenUser does not define itself.
+        if attr.startswith("_"):
+            raise AttributeError(attr)
+        return getattr(self.user, attr)
+
+
+class CompanyJWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    `JWTStatelessUserAuthentication` that still refuses deactivated users.
+    The token alone can't tell, so `is_active` is read from the cached full
+    user. Saving a user drops it from the cache (see `core.signals`), but
+    only from the cache of the process that saved it: the default cache
+    is per process, so other workers see a deactivation within
+    `TOKEN_USER_CACHE_TTL` seconds.
+    """
+
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        if not user.user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return user
+
+
+async def aauthenticate(request):
+    """
+    Authenticate a plain (non-DRF) async view the same way the REST API does:
+    a JWT `Authorization: Bearer` header first (giving a `CompanyTokenUser`),
+    then the Django session.
+    Returns the user, or None when the request is anonymous or the token is
+    invalid.
+    """
+    try:
+        result = await sync_to_async(CompanyJWTAuthentication().authenticate)(request)
+    except AuthenticationFailed:
+        return None
+    if result is not None:
+        return result[0]
+
+    user = await request.auser()
+    return user if user.is_authenticated else None
+
+
+def async_authentication_required(view):
+    """
+    Async view decorator answering 401 like DRF's `IsAuthenticated` unless
+    `aauthenticate` finds a user, which is then set as `request.user`.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await aauthenticate(request)
+        if user is None:
+            return JsonResponse(
+                {'detail': 'Authentication credentials were not provided.'}, status=401
+            )
+        request.user = user
+        return await view(request, *args, **kwargs)
+
+    return wrapper
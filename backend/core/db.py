@@ -0,0 +1,84 @@
+import asyncio
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+REPLICA_ALIAS = "replica"
+REPLICA_LAG_CHECK_SECONDS = getattr(settings, "REPLICA_LAG_CHECK_SECONDS", 2)
+
+# Seconds the replica is behind the primary; 0 when it has replayed
+# everything it received, or when it is not a standby at all.
+REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+_replica_lag = (None, float("-inf"))  # (lag or None when unreachable, checked at)
+
+
+def replica_lag():
+    """
+    Replication lag of the replica in seconds, or None when no replica is
+    configured or it cannot be reached. Checked at most every
+    `REPLICA_LAG_CHECK_SECONDS` per process.
+    """
+    global _replica_lag
+    if REPLICA_ALIAS not in settings.DATABASES:
+        return None
+    lag, checked_at = _replica_lag
+    if time.monotonic() - checked_at < REPLICA_LAG_CHECK_SECONDS:
+        return lag
+    try:
+        with connections[REPLICA_ALIAS].cursor() as cursor:
+            cursor.execute(REPLICA_LAG_SQL)
+            lag = float(cursor.fetchone()[0])
+    except DatabaseError:
+        lag = None
+    _replica_lag = (lag, time.monotonic())
+    return lag
+
+
+def read_alias(max_lag=None):
+    """
+    Database alias for a read that may be served by the replica: heavy
+    timeseries reads, exports and aggregates. Falls back to the primary
+    when the replica is missing, unreachable or more than `max_lag`
+    seconds behind (`REPLICA_MAX_LAG_SECONDS` by default). Freshness
+    sensitive reads pass `max_lag=0` to only use a caught-up replica.
+    """
+    if max_lag is None:
+        max_lag = settings.REPLICA_MAX_LAG_SECONDS
+    lag = replica_lag()
+    if lag is None or lag > max_lag:
+        return DEFAULT_DB_ALIAS
+    return REPLICA_ALIAS
+
+
+async def run_cancellable(func, *args, using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    Run blocking ORM code from an async view in the request's worker thread.
+
+    Under ASGI, Django cancels an async view when the client disconnects,
+    but cancelling the awaiting task does not stop a query already running
+    in a thread. When the task is cancelled, the query in flight on the
+    `using` connection is cancelled on the server as well, so a long range
+    query stops as soon as the user navigates away.
+    """
+    connection = None
+
+    def call():
+        nonlocal connection
+        connection = connections[using]
+        return func(*args, **kwargs)
+
+    try:
+        return await sync_to_async(call)()
+    except asyncio.CancelledError:
+        if connection is not None and connection.connection is not None:
+            # psycopg sends the cancel request on a separate socket, so it
+            # is safe to call while the worker thread waits on the query.
+            connection.connection.cancel()
+        raise
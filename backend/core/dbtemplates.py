@@ -0,0 +1,212 @@
+"""
+Migrated PostgreSQL template databases, cloned instead of migrating.
+
+Running every migration takes tens of seconds, while `CREATE DATABASE ...
+TEMPLATE` copies an already migrated database in about a second. A
+template is named after a hash of all migration files (plus any other
+files its contents depend on), so it is rebuilt automatically whenever a
+migration changes and stale templates are dropped.
+
+Templates are marked `IS_TEMPLATE` and closed to connections, which also
+keeps TimescaleDB's background workers out of them: PostgreSQL refuses
+to clone a database that has other sessions.
+
+Used by `reset_db --template` and the test runner (`core.test_runner`).
+"""
+
+import hashlib
+import importlib
+from contextlib import contextmanager
+from pathlib import Path
+from django.apps import apps
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.migrations.loader import MigrationLoader
+from psycopg import sql
+
+TEMPLATE_MARKER = "_tpl_"
+COPY_FIXTURES_DIR = Path("fixtures") / "copy"
+COPY_BLOCK_SIZE = 1024 * 1024
+# PostgreSQL truncates identifiers longer than this.
+MAX_NAME_LENGTH = 63
+
+
+def migrations_hash(extra_files=()):
+    """Hash of the migration files of every installed app, and `extra_files`."""
+    digest = hashlib.sha256()
+    files = []
+    for app_config in apps.get_app_configs():
+        module_name, _ = MigrationLoader.migrations_module(app_config.label)
+        if module_name is None:
+            continue
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError:
+            continue
+        for directory in getattr(module, "__path__", ()):
+            files.extend(
+                (f"{app_config.label}/{path.name}", path)
+                for path in Path(directory).glob("*.py")
+            )
+    files.extend((Path(path).name, Path(path)) for path in extra_files)
+    for name, path in sorted(files):
+        digest.update(name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:12]
+
+
+def template_name(database, variant="", extra_files=()):
+    suffix = f"{TEMPLATE_MARKER}{migrations_hash(extra_files)}"
+    if variant:
+        suffix += f"_{variant}"
+    return database[: MAX_NAME_LENGTH - len(suffix)] + suffix
+
+
+def database_exists(cursor, name):
+    cursor.execute("SELECT 1 FROM pg_database WHERE datname = %s", [name])
+    return cursor.fetchone() is not None
+
+
+def terminate_connections(cursor, name):
+    cursor.execute(
+        """
+        SELECT pg_terminate_backend(pid) FROM pg_stat_activity
+        WHERE datname = %s AND pid <> pg_backend_pid()
+        """,
+        [name],
+    )
+
+
+def drop_database(cursor, name):
+    if database_exists(cursor, name):
+        cursor.execute(sql.SQL("ALTER DATABASE {} IS_TEMPLATE false").format(sql.Identifier(name)))
+        terminate_connections(cursor, name)
+        cursor.execute(sql.SQL("DROP DATABASE {}").format(sql.Identifier(name)))
+
+
+def clone_database(cursor, template, name):
+    """(Re)create `name` as a copy of `template`."""
+    drop_database(cursor, name)
+    cursor.execute(
+        sql.SQL("CREATE DATABASE {} TEMPLATE {}").format(sql.Identifier(name), sql.Identifier(template))
+    )
+
+
+def seal_template(cursor, name):
+    cursor.execute(
+        sql.SQL("ALTER DATABASE {} WITH IS_TEMPLATE true ALLOW_CONNECTIONS false").format(
+            sql.Identifier(name)
+        )
+    )
+
+
+def drop_stale_templates(cursor, database, keep):
+    """Drop templates of `database` other than those in `keep`."""
+    prefix = database[: MAX_NAME_LENGTH - len(TEMPLATE_MARKER) - 12] + TEMPLATE_MARKER
+    cursor.execute(
+        "SELECT datname FROM pg_database WHERE datname LIKE %s",
+        [prefix.replace("_", r"\_") + "%"],
+    )
+    for (name,) in cursor.fetchall():
+        if name not in keep:
+            drop_database(cursor, name)
+
+
+@contextmanager
+def use_database(name, alias=DEFAULT_DB_ALIAS):
+    """Point Django's `alias` connection at database `name` for a while."""
+    connection = connections[alias]
+    original = connection.settings_dict["NAME"]
+
+    def reconnect(database):
+        connection.close()
+        if hasattr(connection, "close_pool"):
+            connection.close_pool()
+        connection.settings_dict["NAME"] = database
+
+    reconnect(name)
+    try:
+        yield connection
+    finally:
+        reconnect(original)
+
+
+def build_template(cursor, name, source=None, populate=None, alias=DEFAULT_DB_ALIAS):
+    """
+    Create template `name`: a copy of template `source` when given, else a
+    new database with TimescaleDB and every migration applied. `populate`
+    is then called with Django connected to it, to add data.
+    """
+    if source:
+        clone_database(cursor, source, name)
+    else:
+        drop_database(cursor, name)
+        cursor.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(name)))
+    with use_database(name, alias) as connection:
+        if not source:
+            with connection.cursor() as django_cursor:
+                django_cursor.execute("CREATE EXTENSION IF NOT EXISTS timescaledb CASCADE")
+            call_command("migrate", database=alias, interactive=False, verbosity=0)
+        if populate is not None:
+            populate()
+    terminate_connections(cursor, name)
+    seal_template(cursor, name)
+
+
+def ensure_template(cursor, database, alias=DEFAULT_DB_ALIAS, rebuild=False):
+    """Name of the migrated template for `database`, built if missing."""
+    name = template_name(database)
+    if rebuild or not database_exists(cursor, name):
+        build_template(cursor, name, alias=alias)
+    return name
+
+
+def seed_files():
+    """Sources the seeded template's data depends on, besides migrations."""
+    base = Path(settings.BASE_DIR)
+    return [
+        base / "timeseries" / "synthetic.py",
+        base / "timeseries" / "management" / "commands" / "create_test_data.py",
+    ]
+
+
+def copy_fixture_files():
+    """
+    CSV datasets of every installed app, loaded with `COPY`. Each file is
+    `<app>/fixtures/copy/<app_label>.<model_name>.csv` with a header row
+    naming the columns (see `dump_copy_fixtures`).
+    """
+    files = []
+    for app_config in apps.get_app_configs():
+        directory = Path(app_config.path) / COPY_FIXTURES_DIR
+        files.extend(sorted(directory.glob("*.csv")))
+    return files
+
+
+def load_copy_fixtures(paths, alias=DEFAULT_DB_ALIAS):
+    """
+    Stream CSV fixtures into their tables with `COPY`, which is far faster
+    than `loaddata` for large datasets. Everything loads in one transaction,
+    and Django's foreign keys are deferred, so file order doesn't matter.
+    """
+    connection = connections[alias]
+    loaded = []
+    with transaction.atomic(using=alias), connection.cursor() as cursor:
+        for path in paths:
+            model = apps.get_model(path.stem)
+            with open(path, "rb") as f:
+                columns = f.readline().decode().strip()
+                quoted = ", ".join(connection.ops.quote_name(name) for name in columns.split(","))
+                with cursor.copy(
+                    f"COPY {connection.ops.quote_name(model._meta.db_table)} ({quoted}) "
+                    "FROM STDIN WITH (FORMAT csv)"
+                ) as copy:
+                    while block := f.read(COPY_BLOCK_SIZE):
+                        copy.write(block)
+            loaded.append(model)
+        # Rows were loaded with explicit ids; move the sequences past them.
+        for statement in connection.ops.sequence_reset_sql(no_style(), loaded):
+            cursor.execute(statement)
+    return loaded
@@ -0,0 +1,97 @@
+"""
+Verification of Google ID tokens against an in-process copy of Google's
+signing certificates.
+
+`google.oauth2.id_token.verify_oauth2_token` downloads the certificates on
+every call. `GoogleCertificates` keeps them for as long as the response's
+`Cache-Control: max-age` allows and only refetches early when a token is
+signed with a key id it has not seen, so the network is touched about
+once per key rotation.
+"""
+
+import re
+import threading
+from time import monotonic
+import requests
+from django.conf import settings
+from google.auth import jwt as google_jwt
+from .metrics import record_cache_lookup
+
+GOOGLE_CERTS_URL = getattr(
+    settings, "GOOGLE_OAUTH2_CERTS_URL", "https://www.googleapis.com/oauth2/v1/certs"
+)
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+DEFAULT_MAX_AGE = 3600
+# Tokens with unknown key ids trigger at most one refetch per interval, so
+# forged key ids cannot make every login hit Google.
+MIN_REFRESH_INTERVAL = 60
+
+re_max_age = re.compile(r"\bmax-age=(\d+)")
+
+
+def cache_lifetime(headers):
+    """Seconds a certificates response stays fresh according to its headers."""
+    match = re_max_age.search(headers.get("Cache-Control", ""))
+    max_age = int(match.group(1)) if match else DEFAULT_MAX_AGE
+    try:
+        age = int(headers.get("Age", 0))
+    except ValueError:
+        age = 0
+    return max(max_age - age, 0)
+
+
+class GoogleCertificates:
+    """Google's signing certificates by key id, cached per process."""
+
+    def __init__(self, url=GOOGLE_CERTS_URL, session=None, timeout=5):
+        self.url = url
+        # A session keeps the HTTPS connection to Google pooled between fetches.
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        self.fetches = 0
+        self._certs = {}
+        self._expires_at = float("-inf")
+        self._fetched_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def get(self, key_id=None):
+        """
+        The certificates, refetched when the cached copy has expired or
+        does not contain `key_id`.
+        """
+        with self._lock:
+            now = monotonic()
+            expired = now >= self._expires_at
+            rotated = (
+                key_id is not None
+                and key_id not in self._certs
+                and now - self._fetched_at >= MIN_REFRESH_INTERVAL
+            )
+            record_cache_lookup("google_certs", not (expired or rotated))
+            if expired or rotated:
+                self._fetch(now)
+            return self._certs
+
+    def _fetch(self, now):
+        response = self.session.get(self.url, timeout=self.timeout)
+        response.raise_for_status()
+        self._certs = response.json()
+        self._fetched_at = now
+        self._expires_at = now + cache_lifetime(response.headers)
+        self.fetches += 1
+
+
+google_certificates = GoogleCertificates()
+
+
+def verify_google_id_token(token, audience, certificates=google_certificates):
+    """
+    Verify the signature, audience, expiry and issuer of a Google ID token
+    and return its claims, like `verify_oauth2_token`. Raises `ValueError`
+    for invalid tokens.
+    """
+    key_id = google_jwt.decode_header(token).get("kid")
+    claims = google_jwt.decode(token, certs=certificates.get(key_id), audience=audience)
+    if claims.get("iss") not in GOOGLE_ISSUERS:
+        raise ValueError(f"Wrong issuer: {claims.get('iss')}")
+    return claims
@@ -0,0 +1,72 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, check_password, make_password
+
+PASSWORD_HASHING_WORKERS = getattr(
+    settings, "PASSWORD_HASHING_WORKERS", min(4, os.cpu_count() or 1)
+)
+PASSWORD_HASHING_QUEUE = getattr(settings, "PASSWORD_HASHING_QUEUE", 32)
+
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    Django's PBKDF2 hasher with the iteration count taken from the
+    `PASSWORD_HASH_ITERATIONS` setting, so each environment can pick its own
+    cost. Hashes made with another count are rehashed on the next
+    successful login.
+    """
+
+    iterations = getattr(settings, "PASSWORD_HASH_ITERATIONS", PBKDF2PasswordHasher.iterations)
+
+
+class HashingPoolFull(Exception):
+    pass
+
+
+class PasswordHashingPool:
+    """
+    Runs password checks on a small dedicated thread pool. At most `workers`
+    hashes burn CPU at once and at most `queue` more wait; beyond that
+    callers get `HashingPoolFull` immediately instead of piling up, so a
+    login storm cannot take every worker thread and CPU away from the API.
+    """
+
+    def __init__(self, workers=PASSWORD_HASHING_WORKERS, queue=PASSWORD_HASHING_QUEUE):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hashing")
+        self._slots = threading.BoundedSemaphore(workers + queue)
+
+    def run(self, func, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            raise HashingPoolFull
+        try:
+            return self._executor.submit(func, *args, **kwargs).result()
+        finally:
+            self._slots.release()
+
+    def authenticate(self, username, password):
+        """
+        `authenticate()` for the model backend with only the hashing on the
+        pool: the user lookup and a rehash-on-login save run on the calling
+        thread, so pool threads never open database connections. Returns
+        the active user whose password matches, or None.
+        """
+        user_model = get_user_model()
+        try:
+            user = user_model._default_manager.get_by_natural_key(username)
+        except user_model.DoesNotExist:
+            # Hash anyway so unknown users take as long as wrong passwords.
+            self.run(make_password, password)
+            return None
+        rehash = []
+        if not self.run(check_password, password, user.password, setter=rehash.append):
+            return None
+        if rehash:
+            user.set_password(password)
+            user.save(update_fields=["password"])
+        return user if user.is_active else None
+
+
+password_hashing_pool = PasswordHashingPool()
@@ -0,0 +1,368 @@
+import io
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.http import QueryDict
+from rest_framework.renderers import JSONRenderer
+from farms.models import Company, SolarFarm, SolarPanelModel, WindFarm, WindTurbineModel
+from farms.views import query_assets
+from timeseries.export import iter_batches, stream_csv
+from timeseries.live import notify_timeseries_batch
+from timeseries.management.commands.create_test_data import Command as CreateTestDataCommand
+from timeseries.models import WindFarmTimeseries
+from timeseries.serializers import TimeseriesQuerySerializer
+from timeseries.synthetic import copy_node_series, wind_farm_params, wind_node_series
+from timeseries.views import query_farm_series
+
+# Everything the benchmark creates is named with this prefix and removed
+# again afterwards (and before a run, after an interrupted one).
+BENCHMARK_PREFIX = 'bench-'
+INTERVAL = 600
+BUCKETS = ['1 hour', '1 day', '1 week']
+QUERY_FIELDS = ['active_power_mean', 'wind_speed_mean']
+
+
+def summarize(samples):
+    """Latency statistics in milliseconds."""
+    ordered = sorted(samples)
+    return {
+        'runs': len(ordered),
+        'min_ms': round(ordered[0] * 1000, 3),
+        'p50_ms': round(statistics.median(ordered) * 1000, 3),
+        'p95_ms': round(ordered[min(len(ordered) - 1, round(0.95 * (len(ordered) - 1)))] * 1000, 3),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 3),
+    }
+
+
+def measure(func, repeat, warmup=1):
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark ingest and query paths against the configured (local TimescaleDB) '
+        'database with a fixed seed and dataset size, and write the results as JSON. '
+        'It creates and deletes its own farms; do not run it against production.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nodes', type=int, default=25, help='Turbines in the benchmark farm')
+        parser.add_argument('--days', type=int, default=30, help='Days of 10 minute data per turbine')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed of the generated data')
+        parser.add_argument(
+            '--asset-sizes',
+            default='10,1000,100000',
+            help='Comma-separated farm counts to benchmark asset_list with',
+        )
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per query scenario')
+        parser.add_argument('--output', help='File to write the JSON results to (default: stdout)')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark data afterwards')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('The benchmark needs PostgreSQL with TimescaleDB.')
+        self.verbosity = options['verbosity']
+        self.repeat = options['repeat']
+        asset_sizes = [int(size) for size in options['asset_sizes'].split(',') if size.strip()]
+
+        self.cleanup()
+        self.wind_template, self.solar_template = self.create_templates()
+        farm = self.clone(self.wind_template, f'{BENCHMARK_PREFIX}timeseries')
+        periods = options['days'] * 86400 // INTERVAL
+        self.end = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+        self.start = self.end - timedelta(seconds=INTERVAL * periods)
+
+        results = {}
+        try:
+            results['ingest'] = self.bench_ingest(farm, options['nodes'], periods, options['seed'])
+            results['upsert'] = self.bench_upsert(farm)
+            results['bucketed_query'] = self.bench_bucketed(farm)
+            results['latest_value'] = self.bench_latest(farm)
+            results['export'] = self.bench_export(farm)
+            results['asset_list'] = self.bench_asset_list(asset_sizes)
+        finally:
+            if not options['keep']:
+                self.cleanup()
+
+        report = {
+            'run_at': datetime.now(dt_timezone.utc).isoformat(),
+            'environment': self.environment(),
+            'parameters': {
+                key: options[key] for key in ('nodes', 'days', 'seed', 'asset_sizes', 'repeat')
+            },
+            'results': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def log(self, message):
+        # Progress goes to stderr so stdout stays valid JSON.
+        if self.verbosity:
+            self.stderr.write(message)
+
+    def create_templates(self):
+        """
+        A wind and a solar farm to clone, owned by a benchmark company and
+        copied under BENCHMARK_PREFIX names from the `create_test_data`
+        fixtures. Those are created in a transaction that's rolled back,
+        so `cleanup` finds everything the benchmark adds.
+        """
+        helper = CreateTestDataCommand(stdout=io.StringIO())
+        with transaction.atomic():
+            companies = helper.create_companies()
+            turbines, panels = helper.create_turbine_models(), helper.create_panel_models()
+            wind_farms, solar_farms = helper.create_farms(companies, turbines, panels, 1, 1)
+            transaction.set_rollback(True)
+
+        company = companies[0]
+        company.pk = None
+        company.name = company.registration_number = f'{BENCHMARK_PREFIX}company'
+        company.save()
+        templates = []
+        for farm, model_field in ((wind_farms[0], 'turbine_model'), (solar_farms[0], 'panel_model')):
+            model = getattr(farm, model_field)
+            model.pk = None
+            model.model_name = f'{BENCHMARK_PREFIX}{model.model_name}'
+            model.save()
+            farm.pk = None
+            farm.company = company
+            setattr(farm, model_field, model)
+            farm.name = f'{BENCHMARK_PREFIX}template'
+            farm.save()
+            templates.append(farm)
+        return templates
+
+    def clone(self, template, name):
+        farm = type(template).objects.get(pk=template.pk)
+        farm.pk = None
+        farm.name = name
+        farm.save()
+        return farm
+
+    def cleanup(self):
+        # Timeseries rows go with their farms (on_delete=CASCADE), which
+        # must go before the turbine and panel models they protect.
+        WindFarm.objects.filter(name__startswith=BENCHMARK_PREFIX).delete()
+        SolarFarm.objects.filter(name__startswith=BENCHMARK_PREFIX).delete()
+        WindTurbineModel.objects.filter(model_name__startswith=BENCHMARK_PREFIX).delete()
+        SolarPanelModel.objects.filter(model_name__startswith=BENCHMARK_PREFIX).delete()
+        Company.objects.filter(registration_number__startswith=BENCHMARK_PREFIX).delete()
+
+    def bench_ingest(self, farm, nodes, periods, seed):
+        """Bulk load through COPY, as `create_test_data` does, and through `bulk_create`."""
+        self.log(f'Ingest: {nodes} nodes x {periods} rows')
+        params = wind_farm_params(farm)
+        series = [
+            wind_node_series(params, node_id, seed, self.start, periods, INTERVAL)
+            for node_id in range(1, nodes + 1)
+        ]
+        start = time.perf_counter()
+        rows = sum(
+            copy_node_series(WindFarmTimeseries, farm.id, node_id, self.start, INTERVAL, columns)
+            for node_id, columns in enumerate(series, 1)
+        )
+        copy_seconds = time.perf_counter() - start
+
+        # One more turbine through the ORM for comparison, announced to
+        # live dashboards like the COPY batches.
+        objects = self.model_rows(farm, nodes + 1, series[0])
+        start = time.perf_counter()
+        with transaction.atomic():
+            WindFarmTimeseries.objects.bulk_create(objects, batch_size=5000)
+            notify_timeseries_batch(WindFarmTimeseries, farm.id, objects)
+        orm_seconds = time.perf_counter() - start
+        return {
+            'copy': {
+                'rows': rows,
+                'seconds': round(copy_seconds, 3),
+                'rows_per_second': round(rows / copy_seconds),
+            },
+            'bulk_create': {
+                'rows': len(objects),
+                'seconds': round(orm_seconds, 3),
+                'rows_per_second': round(len(objects) / orm_seconds),
+            },
+        }
+
+    def model_rows(self, farm, node_id, columns):
+        step = timedelta(seconds=INTERVAL)
+        names = list(columns)
+        values = [columns[name].round(2).tolist() for name in names]
+        return [
+            WindFarmTimeseries(
+                time=self.start + i * step, farm=farm, node_id=node_id, **dict(zip(names, row))
+            )
+            for i, row in enumerate(zip(*values))
+        ]
+
+    def bench_upsert(self, farm):
+        """
+        `INSERT ... ON CONFLICT DO UPDATE` of a batch where half the rows
+        already exist (late or corrected data) and half are new.
+        """
+        existing = list(
+            WindFarmTimeseries.objects.filter(farm=farm, node_id=1).order_by('-time')[:5000]
+        )
+        for row in existing:
+            row.pk = None
+            row.active_power_mean = (row.active_power_mean or 0) + 1
+        step = timedelta(seconds=INTERVAL)
+        new = [
+            WindFarmTimeseries(
+                time=self.end + i * step, farm=farm, node_id=1, active_power_mean=i
+            )
+            for i in range(1, len(existing) + 1)
+        ]
+        batch = existing + new
+        start = time.perf_counter()
+        WindFarmTimeseries.objects.bulk_create(
+            batch,
+            batch_size=5000,
+            update_conflicts=True,
+            unique_fields=['time', 'node_id', 'farm'],
+            update_fields=['active_power_mean', 'updated_at'],
+        )
+        seconds = time.perf_counter() - start
+        return {
+            'rows': len(batch),
+            'duplicates': len(existing),
+            'seconds': round(seconds, 3),
+            'rows_per_second': round(len(batch) / seconds),
+        }
+
+    def bench_bucketed(self, farm):
+        results = {}
+        for interval in BUCKETS:
+            serializer = TimeseriesQuerySerializer(
+                data={
+                    'start': self.start.isoformat(),
+                    'end': self.end.isoformat(),
+                    'interval': interval,
+                    'fields': ','.join(QUERY_FIELDS),
+                },
+                context={'model': WindFarmTimeseries},
+            )
+            serializer.is_valid(raise_exception=True)
+            query = serializer.validated_data
+            self.log(f'Bucketed query: {interval}')
+            results[interval] = measure(
+                lambda: query_farm_series(WindFarmTimeseries, farm.id, query, 'default'),
+                self.repeat,
+            )
+        return results
+
+    def bench_latest(self, farm):
+        rows = WindFarmTimeseries.timescale.for_farm(farm.id)
+        self.log('Latest value')
+        return {
+            'one_node': measure(
+                lambda: rows.filter(node_id=1).order_by('-time').values_list('time', *QUERY_FIELDS).first(),
+                self.repeat,
+            ),
+            'every_node': measure(
+                lambda: list(
+                    rows.order_by('node_id', '-time').distinct('node_id')
+                    .values_list('node_id', 'time', *QUERY_FIELDS)
+                ),
+                self.repeat,
+            ),
+        }
+
+    def bench_export(self, farm):
+        """Stream the farm's raw rows of the benchmark period as CSV, as `export_timeseries` does."""
+        fields = WindFarmTimeseries.measurement_fields()
+        rows = (
+            WindFarmTimeseries.timescale.for_farm(farm.id)
+            .in_range(self.start, self.end)
+            .raw_rows(fields)
+        )
+        count = rows.count()
+        self.log(f'Export: {count} rows')
+        start = time.perf_counter()
+        first_chunk = None
+        size = 0
+        for chunk in stream_csv(iter_batches(rows), ['time', 'node_id', *fields]):
+            if first_chunk is None:
+                first_chunk = time.perf_counter() - start
+            size += len(chunk)
+        seconds = time.perf_counter() - start
+        return {
+            'rows': count,
+            'bytes': size,
+            'first_chunk_ms': round((first_chunk or 0) * 1000, 3),
+            'seconds': round(seconds, 3),
+            'rows_per_second': round(count / seconds),
+        }
+
+    def bench_asset_list(self, sizes):
+        """`asset_list` query and JSON rendering, with half wind and half solar farms."""
+        results = {}
+        created = 0
+        params = QueryDict(f'search={BENCHMARK_PREFIX}asset')
+        for size in sorted(sizes):
+            self.log(f'asset_list: {size} assets')
+            self.add_assets(created, size)
+            created = size
+            results[str(size)] = measure(
+                lambda: JSONRenderer().render(query_assets(params)),
+                max(1, self.repeat // 4) if size >= 10_000 else self.repeat,
+            )
+        return results
+
+    def add_assets(self, start, end):
+        """Grow the benchmark assets from `start` to `end` farms."""
+        for template, count in (
+            (self.wind_template, (end + 1) // 2 - (start + 1) // 2),
+            (self.solar_template, end // 2 - start // 2),
+        ):
+            model = type(template)
+            values = {
+                field.attname: getattr(template, field.attname)
+                for field in model._meta.concrete_fields
+                if not field.primary_key
+            }
+            model.objects.bulk_create(
+                [
+                    model(**{**values, 'name': f'{BENCHMARK_PREFIX}asset-{start + i}'})
+                    for i in range(count)
+                ],
+                batch_size=5000,
+            )
+
+    def environment(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT extversion FROM pg_extension WHERE extname = 'timescaledb'")
+            timescale = cursor.fetchone()
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'commit': commit,
+            'python': sys.version.split()[0],
+            'django': django.get_version(),
+            'postgresql': connection.pg_version,
+            'timescaledb': timescale[0] if timescale else None,
+            'platform': platform.platform(),
+        }
@@ -0,0 +1,81 @@
+import logging
+import queue
+import statistics
+import tempfile
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from django.core.management.base import BaseCommand
+from core.logging import BackgroundQueueListener, DroppingQueueHandler, JsonFormatter
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure how long logging calls block the calling thread when records are '
+        'written directly to a rotating JSON file, and when they go through the '
+        'queue handler used by settings.LOGGING.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--records', type=int, default=20000, help='Records logged per thread')
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent logging threads')
+        parser.add_argument(
+            '--max-bytes',
+            type=int,
+            default=5 * 1024 * 1024,
+            help='Rotation size of the benchmark log file',
+        )
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as log_dir:
+            for mode in ('direct', 'queued'):
+                file_handler = RotatingFileHandler(
+                    Path(log_dir) / f'{mode}.log', maxBytes=options['max_bytes'], backupCount=2
+                )
+                file_handler.setFormatter(JsonFormatter())
+                listener = None
+                if mode == 'direct':
+                    handler = file_handler
+                else:
+                    log_queue = queue.Queue(maxsize=10000)
+                    handler = DroppingQueueHandler(log_queue)
+                    listener = BackgroundQueueListener(log_queue, file_handler)
+                DroppingQueueHandler.dropped = 0
+
+                latencies = self.run(handler, options['threads'], options['records'])
+                if listener is not None:
+                    listener.stop()
+                file_handler.close()
+                self.report(mode, latencies)
+
+    def run(self, handler, thread_count, records):
+        logger = logging.Logger('benchmark_logging', logging.INFO)
+        logger.addHandler(handler)
+        latencies = []
+        lock = threading.Lock()
+
+        def work():
+            own = []
+            for i in range(records):
+                start = time.perf_counter()
+                logger.info('GET /api/farms/assets/ 200 %d', i, extra={'view': 'asset-list', 'db_queries': 3})
+                own.append(time.perf_counter() - start)
+            with lock:
+                latencies.extend(own)
+
+        threads = [threading.Thread(target=work) for _ in range(thread_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies
+
+    def report(self, mode, latencies):
+        quantiles = statistics.quantiles(latencies, n=1000)
+        self.stdout.write(
+            f'{mode:>7}: {len(latencies)} records, '
+            f'p50 {quantiles[499] * 1e6:.1f}us, p99 {quantiles[989] * 1e6:.1f}us, '
+            f'p99.9 {quantiles[998] * 1e6:.1f}us, max {max(latencies) * 1e6:.1f}us'
+            + (f', {DroppingQueueHandler.dropped} dropped' if mode == 'queued' else '')
+        )
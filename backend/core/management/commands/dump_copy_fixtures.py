@@ -0,0 +1,44 @@
+from pathlib import Path
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from core.dbtemplates import COPY_FIXTURES_DIR
+
+
+class Command(BaseCommand):
+    help = (
+        'Write models as CSV datasets for the test runner, which loads them with COPY '
+        'into the test template database (see core.test_runner). Creates '
+        '<app>/fixtures/copy/<app_label>.<model_name>.csv for each model.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('models', nargs='+', help='Models as app_label.ModelName')
+        parser.add_argument('--where', help='SQL condition selecting the rows (default: all)')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database to read from')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        quote = connection.ops.quote_name
+        for label in options['models']:
+            try:
+                model = apps.get_model(label)
+            except (LookupError, ValueError) as e:
+                raise CommandError(str(e))
+            columns = [field.column for field in model._meta.concrete_fields]
+            query = 'SELECT {} FROM {}'.format(
+                ', '.join(quote(column) for column in columns), quote(model._meta.db_table)
+            )
+            if options['where']:
+                query += f" WHERE {options['where']}"
+            query += f' ORDER BY {quote(model._meta.pk.column)}'
+
+            directory = Path(model._meta.app_config.path) / COPY_FIXTURES_DIR
+            directory.mkdir(parents=True, exist_ok=True)
+            path = directory / f'{model._meta.label_lower}.csv'
+            with open(path, 'wb') as f, connection.cursor() as cursor:
+                f.write((','.join(columns) + '\n').encode())
+                with cursor.copy(f'COPY ({query}) TO STDOUT WITH (FORMAT csv)') as copy:
+                    for block in copy:
+                        f.write(block)
+            self.stdout.write(self.style.SUCCESS(f'Wrote {path}'))
@@ -0,0 +1,230 @@
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.core.management.base import BaseCommand, CommandError
+
+try:
+    import httpx
+except ImportError:  # only needed for load testing, see the `loadtest` extra
+    httpx = None
+
+DEFAULT_MIX = 'asset_list=4,session=3,timeseries=6,upload=1'
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Load test a running server over HTTP. Logs in once through /api/core/login/, '
+        'reuses the JWT (logging in again when it expires) and drives a weighted mix of '
+        'asset list, session, timeseries and upload requests from concurrent clients. '
+        'Reports latency percentiles, throughput and error rates per endpoint.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://localhost:8000', help='Server to load')
+        parser.add_argument('--email', default=os.getenv('LOADTEST_EMAIL'), help='Login email (or LOADTEST_EMAIL)')
+        parser.add_argument(
+            '--password', default=os.getenv('LOADTEST_PASSWORD'), help='Login password (or LOADTEST_PASSWORD)'
+        )
+        parser.add_argument('--concurrency', type=int, default=20, help='Concurrent clients')
+        parser.add_argument('--duration', type=float, default=30, help='Seconds to run for')
+        parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Endpoint weights (default: {DEFAULT_MIX})')
+        parser.add_argument('--upload-size', type=int, default=64 * 1024, help='Bytes per uploaded file')
+        parser.add_argument('--timeout', type=float, default=30, help='Request timeout in seconds')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the request mix')
+        parser.add_argument('--output', help='Also write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        if httpx is None:
+            raise CommandError('Load testing needs httpx: install the "loadtest" extra.')
+        if not options['email'] or not options['password']:
+            raise CommandError('Pass --email and --password (or set LOADTEST_EMAIL/LOADTEST_PASSWORD).')
+        self.options = options
+        self.mix = self.parse_mix(options['mix'])
+        self.upload = b'time,node_id,active_power_mean\n'.ljust(options['upload_size'], b'0')
+        results = asyncio.run(self.run())
+
+        self.report(results)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+
+    def parse_mix(self, value):
+        mix = {}
+        for item in value.split(','):
+            name, _, weight = item.partition('=')
+            name = name.strip()
+            if not hasattr(self, f'request_{name}'):
+                raise CommandError(f'Unknown endpoint in --mix: {name}')
+            try:
+                mix[name] = float(weight or 1)
+            except ValueError:
+                raise CommandError(f'Invalid weight in --mix: {item}')
+        return mix
+
+    async def run(self):
+        options = self.options
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(lambda: defaultdict(int))
+        self.token = None
+        self.login_lock = asyncio.Lock()
+        limits = httpx.Limits(max_connections=options['concurrency'])
+        async with httpx.AsyncClient(
+            base_url=options['base_url'], timeout=options['timeout'], limits=limits
+        ) as client:
+            await self.login(client)
+            self.farms = await self.fetch_farms(client)
+
+            deadline = time.perf_counter() + options['duration']
+            started = time.perf_counter()
+            await asyncio.gather(*(
+                self.client_loop(client, deadline, random.Random(options['seed'] + i))
+                for i in range(options['concurrency'])
+            ))
+            elapsed = time.perf_counter() - started
+        return self.summarize(elapsed)
+
+    async def login(self, client, stale_token=None):
+        async with self.login_lock:
+            if self.token is not None and self.token != stale_token:
+                return  # Another client already logged in again
+            response = await client.post('/api/core/login/', json={
+                'email': self.options['email'], 'password': self.options['password'],
+            })
+            if response.status_code != 200:
+                raise CommandError(f'Login failed ({response.status_code}): {response.text[:200]}')
+            self.token = response.json()['tokens']['access']
+
+    async def fetch_farms(self, client):
+        """
+        Farms to query timeseries of. The asset list isn't scoped by company
+        but the timeseries endpoints are, so every listed farm is probed once
+        and only those the user may read are kept: other companies' farms
+        would answer fast 404s, counted as errors and skewing the latencies.
+        """
+        if 'timeseries' not in self.mix:
+            return []
+        response = await client.get('/api/farms/assets/', headers=self.auth_headers())
+        response.raise_for_status()
+        listed = [(asset['type'], asset['id']) for asset in response.json()]
+        readable = await asyncio.gather(*(self.can_read(client, *farm) for farm in listed))
+        farms = [farm for farm, ok in zip(listed, readable) if ok]
+        if not farms:
+            raise CommandError(
+                "No farms of the user's company to query timeseries for; run create_test_data first."
+            )
+        return farms
+
+    async def can_read(self, client, farm_type, farm_id):
+        end = datetime.now(dt_timezone.utc)
+        response = await client.get(
+            f'/api/timeseries/{farm_type}/{farm_id}/',
+            params={'start': (end - timedelta(minutes=10)).isoformat(), 'end': end.isoformat()},
+            headers=self.auth_headers(),
+        )
+        if response.status_code == 404:
+            return False
+        response.raise_for_status()
+        return True
+
+    def auth_headers(self):
+        return {'Authorization': f'Bearer {self.token}'}
+
+    async def client_loop(self, client, deadline, rng):
+        names, weights = list(self.mix), list(self.mix.values())
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            request = getattr(self, f'request_{name}')
+            token = self.token
+            start = time.perf_counter()
+            try:
+                response = await request(client, rng)
+            except httpx.HTTPError as exc:
+                self.errors[name][type(exc).__name__] += 1
+                continue
+            if response.status_code == 401:
+                await self.login(client, stale_token=token)
+                continue
+            self.latencies[name].append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                self.errors[name][str(response.status_code)] += 1
+
+    async def request_asset_list(self, client, rng):
+        return await client.get('/api/farms/assets/', headers=self.auth_headers())
+
+    async def request_session(self, client, rng):
+        return await client.get('/api/core/session/', headers=self.auth_headers())
+
+    async def request_timeseries(self, client, rng):
+        farm_type, farm_id = rng.choice(self.farms)
+        end = datetime.now(dt_timezone.utc)
+        days = rng.choice([1, 7, 30])
+        return await client.get(
+            f'/api/timeseries/{farm_type}/{farm_id}/',
+            params={
+                'start': (end - timedelta(days=days)).isoformat(),
+                'end': end.isoformat(),
+                'interval': {1: '10 minutes', 7: '1 hour', 30: '6 hours'}[days],
+            },
+            headers=self.auth_headers(),
+        )
+
+    async def request_upload(self, client, rng):
+        return await client.post(
+            '/api/data-import/uploads/',
+            files={'file': ('loadtest.csv', self.upload, 'text/csv')},
+            headers=self.auth_headers(),
+        )
+
+    def summarize(self, elapsed):
+        endpoints = {}
+        for name in self.mix:
+            ordered = sorted(self.latencies[name])
+            errors = dict(self.errors[name])
+            total = len(ordered) + sum(
+                count for kind, count in errors.items() if not kind.isdigit()
+            )
+            endpoints[name] = {
+                'requests': total,
+                'throughput': round(total / elapsed, 2),
+                'error_rate': round(sum(errors.values()) / total, 4) if total else 0.0,
+                'errors': errors,
+                **({
+                    'p50_ms': round(statistics.median(ordered) * 1000, 1),
+                    'p95_ms': round(percentile(ordered, 0.95) * 1000, 1),
+                    'p99_ms': round(percentile(ordered, 0.99) * 1000, 1),
+                    'max_ms': round(ordered[-1] * 1000, 1),
+                } if ordered else {}),
+            }
+        return {
+            'base_url': self.options['base_url'],
+            'concurrency': self.options['concurrency'],
+            'seconds': round(elapsed, 1),
+            'mix': self.mix,
+            'endpoints': endpoints,
+        }
+
+    def report(self, results):
+        self.stdout.write(
+            f"{results['concurrency']} clients for {results['seconds']}s against {results['base_url']}"
+        )
+        self.stdout.write(
+            f"{'endpoint':<12} {'requests':>9} {'req/s':>8} {'errors':>7} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+        )
+        for name, stats in results['endpoints'].items():
+            self.stdout.write(
+                f"{name:<12} {stats['requests']:>9} {stats['throughput']:>8} "
+                f"{stats['error_rate']:>7.2%} {stats.get('p50_ms', '-'):>8} "
+                f"{stats.get('p95_ms', '-'):>8} {stats.get('p99_ms', '-'):>8}"
+            )
+            if stats['errors']:
+                self.stdout.write(f"{'':<12} errors: {stats['errors']}")
@@ -3,12 +3,21 @@ from django.core.management import call_command
 from django.contrib.auth import get_user_model
 from django.conf import settings
 import os
-import psycopg2
-from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+import psycopg
 import time
 from typing import Optional
 import sys
 from dotenv import load_dotenv
+from core.dbtemplates import (
+    build_template,
+    clone_database,
+    database_exists,
+    drop_stale_templates,
+    ensure_template,
+    seed_files,
+    template_name,
+    terminate_connections,
+)
 
 # Load environment variables at the start
 load_dotenv()
@@ -27,6 +36,22 @@ class Command(BaseCommand):
             action='store_true',
             help='Keep existing migration files',
         )
+        parser.add_argument(
+            '--template',
+            action='store_true',
+            help='Clone a cached, migrated template database instead of migrating '
+                 '(implies --keep-migrations; the template is rebuilt when migrations change)',
+        )
+        parser.add_argument(
+            '--seeded',
+            action='store_true',
+            help='With --template, clone a template that also holds the superuser and test data',
+        )
+        parser.add_argument(
+            '--rebuild-template',
+            action='store_true',
+            help='With --template, rebuild the template even if it is up to date',
+        )
         parser.add_argument(
             '--retry-attempts',
             type=int,
@@ -34,25 +59,25 @@ class Command(BaseCommand):
             help='Number of connection retry attempts',
         )
 
-    def connect_with_retry(self, dbname: str, retry_attempts: int) -> Optional[tuple[psycopg2.extensions.connection, psycopg2.extensions.cursor]]:
+    def connect_with_retry(self, dbname: str, retry_attempts: int) -> Optional[tuple[psycopg.Connection, psycopg.Cursor]]:
         """Attempt to connect to PostgreSQL with retries."""
         attempt = 0
         last_error = None
 
         while attempt < retry_attempts:
             try:
-                conn = psycopg2.connect(
+                conn = psycopg.connect(
                     dbname=dbname,
                     user=os.getenv('POSTGRES_USER'),
                     password=os.getenv('POSTGRES_PASSWORD'),
                     host=os.getenv('POSTGRES_HOST'),
                     port=os.getenv('POSTGRES_PORT'),
-                    connect_timeout=10
+                    connect_timeout=10,
+                    autocommit=True
                 )
-                conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
                 cursor = conn.cursor()
                 return conn, cursor
-            except psycopg2.Error as e:
+            except psycopg.Error as e:
                 last_error = e
                 attempt += 1
                 if attempt < retry_attempts:
@@ -102,6 +127,48 @@ class Command(BaseCommand):
                             f'Could not remove migration file {app}/{filename}: {e}'
                         ))
 
+    def create_superuser(self):
+        """Create the superuser from the DJANGO_SUPERUSER_* environment variables."""
+        User = get_user_model()
+        if not User.objects.filter(username=os.getenv('DJANGO_SUPERUSER_USERNAME')).exists():
+            self.stdout.write('Creating superuser...')
+            User.objects.create_superuser(
+                username=os.getenv('DJANGO_SUPERUSER_USERNAME'),
+                email=os.getenv('DJANGO_SUPERUSER_EMAIL'),
+                password=os.getenv('DJANGO_SUPERUSER_PASSWORD')
+            )
+            self.stdout.write(self.style.SUCCESS('Superuser created successfully'))
+        else:
+            self.stdout.write('Superuser already exists')
+
+    def reset_from_template(self, cursor, db_name, options):
+        """Recreate the database as a copy of the (seeded) migrated template."""
+        started = time.perf_counter()
+        rebuild = options['rebuild_template']
+        template = ensure_template(cursor, db_name, rebuild=rebuild)
+        templates = [template]
+        if options['seeded']:
+            seeded = template_name(db_name, 'seeded', seed_files())
+            if rebuild or not database_exists(cursor, seeded):
+                self.stdout.write(f'Building seeded template {seeded}...')
+
+                def populate():
+                    self.create_superuser()
+                    call_command('create_test_data', workers=1, seed=0, stdout=self.stdout)
+
+                build_template(cursor, seeded, source=template, populate=populate)
+            templates.append(seeded)
+        drop_stale_templates(cursor, db_name, keep=templates)
+
+        self.stdout.write(f'Cloning {templates[-1]} into {db_name}...')
+        terminate_connections(cursor, db_name)
+        clone_database(cursor, templates[-1], db_name)
+        if not options['seeded']:
+            self.create_superuser()
+        self.stdout.write(self.style.SUCCESS(
+            f'\nDatabase reset from template in {time.perf_counter() - started:.1f}s'
+        ))
+
     def handle(self, *args, **options):
         # Safety check for production environment
         if not settings.DEBUG and not options['force']:
@@ -123,10 +190,20 @@ class Command(BaseCommand):
             raise CommandError('Could not connect to PostgreSQL')
         
         conn, cursor = result
+        db_name = db_settings['NAME']
+
+        if options['template'] or options['seeded']:
+            try:
+                self.reset_from_template(cursor, db_name, options)
+            except psycopg.Error as e:
+                raise CommandError(f'Database operation failed: {e}')
+            finally:
+                cursor.close()
+                conn.close()
+            return
 
         try:
             # Drop and recreate the database
-            db_name = db_settings['NAME']
             
             # Close existing connections to the target database
             self.stdout.write('Closing existing connections...')
@@ -161,7 +238,7 @@ class Command(BaseCommand):
             cursor.execute('CREATE EXTENSION IF NOT EXISTS timescaledb CASCADE')
             self.stdout.write(self.style.SUCCESS('TimescaleDB extension created successfully'))
 
-        except psycopg2.Error as e:
+        except psycopg.Error as e:
             raise CommandError(f'Database operation failed: {e}')
 
         finally:
@@ -184,17 +261,7 @@ class Command(BaseCommand):
             call_command('migrate')
             
             # Create superuser using environment variables
-            User = get_user_model()
-            if not User.objects.filter(username=os.getenv('DJANGO_SUPERUSER_USERNAME')).exists():
-                self.stdout.write('Creating superuser...')
-                User.objects.create_superuser(
-                    username=os.getenv('DJANGO_SUPERUSER_USERNAME'),
-                    email=os.getenv('DJANGO_SUPERUSER_EMAIL'),
-                    password=os.getenv('DJANGO_SUPERUSER_PASSWORD')
-                )
-                self.stdout.write(self.style.SUCCESS('Superuser created successfully'))
-            else:
-                self.stdout.write('Superuser already exists')
+            self.create_superuser()
 
             # Create test data
             self.stdout.write('Creating test data...')
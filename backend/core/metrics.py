@@ -0,0 +1,120 @@
+"""
+Prometheus metrics, served at `/metrics`.
+
+Values are kept in process memory, so recording one costs well under a
+microsecond. When the app runs as several worker processes (gunicorn,
+uvicorn --workers), point `PROMETHEUS_MULTIPROC_DIR` at an empty directory
+before the workers start: each process then writes its values to files
+there and `/metrics` adds them up across all of them. Under gunicorn, also
+call `prometheus_client.multiprocess.mark_process_dead(worker.pid)` from
+the `child_exit` server hook.
+"""
+
+import os
+from django.db import connections
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+REQUEST_LATENCY = Histogram(
+    "firmaboard_http_request_duration_seconds",
+    "Request latency by URL route",
+    ["route", "method", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+# Ingest labels must stay bounded: every label value is its own series.
+INGEST_LABELS = ["source", "farm_type"]
+INGEST_ROWS = Counter(
+    "firmaboard_ingest_rows_total",
+    "Timeseries rows ingested, by source and farm type",
+    INGEST_LABELS,
+)
+INGEST_REJECTED_ROWS = Counter(
+    "firmaboard_ingest_rejected_rows_total",
+    "Rows rejected during ingest, by source and farm type",
+    INGEST_LABELS,
+)
+INGEST_BATCH_LATENCY = Histogram(
+    "firmaboard_ingest_batch_duration_seconds",
+    "Time to load one ingest batch, by source and farm type",
+    INGEST_LABELS,
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "firmaboard_db_pool_connections",
+    "Connections in the psycopg pool, by database alias and state",
+    ["alias", "state"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_WAITING = Gauge(
+    "firmaboard_db_pool_waiting_requests",
+    "Requests waiting for a pooled connection",
+    ["alias"],
+    multiprocess_mode="livesum",
+)
+CACHE_REQUESTS = Counter(
+    "firmaboard_cache_requests_total",
+    "In-process cache lookups, by cache and hit/miss",
+    ["cache", "result"],
+)
+LIVE_SUBSCRIBERS = Gauge(
+    "firmaboard_live_subscribers",
+    "Open live-updates streams",
+    multiprocess_mode="livesum",
+)
+
+
+def record_cache_lookup(cache, hit):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def observe_ingest_batch(source, farm_type, rows, rejected=0, duration=None):
+    """
+    Record one loaded batch. `source` is the kind of load, from a fixed
+    set such as "upload" or "create_test_data", never a job or file id.
+    """
+    INGEST_ROWS.labels(source, farm_type).inc(rows)
+    if rejected:
+        INGEST_REJECTED_ROWS.labels(source, farm_type).inc(rejected)
+    if duration is not None:
+        INGEST_BATCH_LATENCY.labels(source, farm_type).observe(duration)
+
+
+def observe_db_pools():
+    """
+    Sample the connection pools this process has already opened. Django
+    creates a pool on first use of its alias, so reading `.pool` here would
+    open one (e.g. to an unused replica); aliases without a pool yet are
+    skipped instead.
+    """
+    for alias in connections:
+        pool = getattr(connections[alias], "_connection_pools", {}).get(alias)
+        if pool is None:
+            continue
+        stats = pool.get_stats()
+        available = stats.get("pool_available", 0)
+        DB_POOL_CONNECTIONS.labels(alias, "idle").set(available)
+        DB_POOL_CONNECTIONS.labels(alias, "used").set(stats.get("pool_size", 0) - available)
+        DB_POOL_WAITING.labels(alias).set(stats.get("requests_waiting", 0))
+
+
+def render_metrics():
+    """
+    The exposition text for all processes, and its content type. Pool
+    gauges are sampled now rather than per request; with several workers
+    each one's pools were last sampled when it served a scrape.
+    """
+    observe_db_pools()
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
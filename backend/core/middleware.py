@@ -0,0 +1,217 @@
+import cProfile
+import logging
+import random
+import threading
+import time
+from pathlib import Path
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+from .metrics import REQUEST_LATENCY
+from .profiling import RequestStats, current_stats
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+try:
+    import pyinstrument
+except ImportError:  # pyinstrument is optional, cProfile is always available
+    pyinstrument = None
+
+logger = logging.getLogger("core.profiling")
+
+# Python allows one active cProfile profiler per process.
+cprofile_lock = threading.Lock()
+
+re_accepts_brotli = _lazy_re_compile(r"\bbr\b")
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Compress API responses with brotli when the client and server support it,
+    falling back to Django's gzip behaviour otherwise.
+
+    Brotli is only applied to non-HTML, non-streaming responses. HTML pages
+    carry CSRF tokens, so they keep gzip with Django's BREACH padding.
+    Server-Sent Events are never compressed: a compressor would buffer
+    events until its block fills.
+    """
+
+    brotli_quality = 5
+
+    def process_response(self, request, response):
+        if response.get("Content-Type", "").startswith("text/event-stream"):
+            return response
+        if brotli is None or not self._wants_brotli(request, response):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        compressed_content = brotli.compress(response.content, quality=self.brotli_quality)
+        if len(compressed_content) >= len(response.content):
+            return response
+        response.content = compressed_content
+        response.headers["Content-Length"] = str(len(response.content))
+
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "br"
+        return response
+
+    def _wants_brotli(self, request, response):
+        if response.streaming or response.has_header("Content-Encoding"):
+            return False
+        if len(response.content) < 200:
+            return False
+        if response.get("Content-Type", "").startswith("text/html"):
+            return False
+        return bool(re_accepts_brotli.search(request.META.get("HTTP_ACCEPT_ENCODING", "")))
+
+
+class RequestProfilingMiddleware:
+    """
+    Measure the SQL query count, database time, serializer time (DRF
+    serializers' `.data`), render time (DRF renderers turning the response
+    data into bytes) and response size of every request. They are sent back as a
+    `Server-Timing` header and logged to `core.profiling`, at WARNING level
+    for requests over `REQUEST_PROFILING_SLOW_MS` or
+    `REQUEST_PROFILING_MAX_QUERIES`. Latency per route is also recorded for
+    `/metrics`.
+
+    A `REQUEST_PROFILING_SAMPLE_RATE` fraction of sync requests also runs
+    under a profiler (pyinstrument when installed, else cProfile); when such
+    a request turns out slow, the profile is written to
+    `REQUEST_PROFILING_DIR`. Only one cProfile profiler can be active per
+    process, so sampled requests arriving while another one is profiled
+    are only measured.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.slow_seconds = getattr(settings, "REQUEST_PROFILING_SLOW_MS", 500) / 1000
+        self.max_queries = getattr(settings, "REQUEST_PROFILING_MAX_QUERIES", 50)
+        self.sample_rate = getattr(settings, "REQUEST_PROFILING_SAMPLE_RATE", 0.0)
+        self.profile_dir = Path(getattr(settings, "REQUEST_PROFILING_DIR", "profiles"))
+        self.server_timing = getattr(settings, "REQUEST_PROFILING_SERVER_TIMING", True)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats = RequestStats(started_at=time.perf_counter())
+        token = current_stats.set(stats)
+        profiler = self.start_profiler()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+            if profiler is not None:
+                self.stop_profiler(profiler)
+        return self.finish(request, response, stats, profiler)
+
+    async def __acall__(self, request):
+        # Profilers only see the event loop thread, so async requests are
+        # measured but never profiled.
+        stats = RequestStats(started_at=time.perf_counter())
+        token = current_stats.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        return self.finish(request, response, stats, None)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; time that step.
+        stats = current_stats.get()
+        if stats is not None:
+            render_started = time.perf_counter()
+
+            def rendered(response):
+                stats.render_time = time.perf_counter() - render_started
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def start_profiler(self):
+        if not self.sample_rate or random.random() >= self.sample_rate:
+            return None
+        if pyinstrument is not None:
+            profiler = pyinstrument.Profiler()
+            profiler.start()
+            return profiler
+        if not cprofile_lock.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiling tool (a debugger, coverage) holds the hook.
+            cprofile_lock.release()
+            return None
+        return profiler
+
+    def stop_profiler(self, profiler):
+        if pyinstrument is not None:
+            profiler.stop()
+        else:
+            profiler.disable()
+            cprofile_lock.release()
+
+    def finish(self, request, response, stats, profiler):
+        total_time = stats.total_time
+        if not response.streaming:
+            stats.response_size = len(response.content)
+        if self.server_timing:
+            response["Server-Timing"] = stats.server_timing(total_time)
+
+        match = request.resolver_match
+        view = match.view_name if match else None
+        # Label by route pattern, not path, to keep label values bounded.
+        REQUEST_LATENCY.labels(
+            match.route if match else "unresolved", request.method, response.status_code
+        ).observe(total_time)
+        slow = total_time >= self.slow_seconds or stats.queries >= self.max_queries
+        profile_path = None
+        if slow and profiler is not None:
+            profile_path = self.write_profile(profiler, view, total_time)
+
+        logger.log(
+            logging.WARNING if slow else logging.INFO,
+            "%s %s %s %.1fms %d queries",
+            request.method, request.path, response.status_code, total_time * 1000, stats.queries,
+            extra={
+                "view": view,
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                "duration_ms": round(total_time * 1000, 1),
+                "db_queries": stats.queries,
+                "db_ms": round(stats.db_time * 1000, 1),
+                "serializer_ms": round(stats.serializer_time * 1000, 1),
+                "render_ms": round(stats.render_time * 1000, 1),
+                "response_bytes": stats.response_size,
+                "profile": str(profile_path) if profile_path else None,
+            },
+        )
+        return response
+
+    def write_profile(self, profiler, view, total_time):
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        view = (view or "unresolved").replace(":", ".")
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}-{view}-{total_time * 1000:.0f}ms"
+        if pyinstrument is not None:
+            path = self.profile_dir / f"{name}.html"
+            path.write_text(profiler.output_html())
+        else:
+            path = self.profile_dir / f"{name}.prof"
+            profiler.dump_stats(path)
+        return path
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Index the expiry of simplejwt's outstanding tokens so `prune_tokens`
+    finds expired rows without scanning a table that grows with every
+    refresh token rotation. Built concurrently to avoid blocking logins.
+    """
+
+    atomic = False
+
+    dependencies = [
+        ("core", "0001_initial"),
+        ("token_blacklist", "0012_alter_outstandingtoken_user"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS token_blacklist_outstandingtoken_expires_at_idx "
+            "ON token_blacklist_outstandingtoken (expires_at)",
+            reverse_sql="DROP INDEX CONCURRENTLY IF EXISTS token_blacklist_outstandingtoken_expires_at_idx",
+        ),
+    ]
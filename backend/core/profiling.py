@@ -0,0 +1,90 @@
+"""
+Per-request cost accounting for `RequestProfilingMiddleware`.
+
+SQL is timed by an execute wrapper installed on every new database
+connection, and serializer output by `install_serializer_timer`, which
+wraps `BaseSerializer.data`. Both record into the `RequestStats` of the
+request being served, found through a context variable, so work done by
+async views in worker threads is counted too.
+"""
+
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import wraps
+from time import perf_counter
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from rest_framework.serializers import BaseSerializer
+
+current_stats = ContextVar("current_request_stats", default=None)
+
+
+@dataclass
+class RequestStats:
+    started_at: float
+    queries: int = 0
+    db_time: float = 0.0
+    serializer_time: float = 0.0
+    render_time: float = 0.0
+    # Set while a serializer's `.data` is timed, so nested ones aren't
+    # counted twice.
+    serializing: bool = False
+    response_size: int | None = None
+
+    @property
+    def total_time(self):
+        return perf_counter() - self.started_at
+
+    def server_timing(self, total_time):
+        return ", ".join([
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+            f'serializer;dur={self.serializer_time * 1000:.1f}',
+            f'render;dur={self.render_time * 1000:.1f}',
+            f'total;dur={total_time * 1000:.1f}',
+        ])
+
+
+def time_query(execute, sql, params, many, context):
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += perf_counter() - start
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+def install_serializer_timer():
+    """
+    Time every DRF serializer's `.data`, where serializers turn instances
+    into primitives, into the current request's `serializer_time`.
+    `Serializer.data` and `ListSerializer.data` both go through
+    `BaseSerializer.data`, so wrapping it covers them.
+    """
+    data = BaseSerializer.data.fget
+    if getattr(data, "timed", False):
+        return
+
+    @wraps(data)
+    def timed_data(serializer):
+        stats = current_stats.get()
+        if stats is None or stats.serializing:
+            return data(serializer)
+        stats.serializing = True
+        start = perf_counter()
+        try:
+            return data(serializer)
+        finally:
+            stats.serializing = False
+            stats.serializer_time += perf_counter() - start
+
+    timed_data.timed = True
+    BaseSerializer.data = property(timed_data)
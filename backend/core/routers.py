@@ -0,0 +1,23 @@
+from django.db import DEFAULT_DB_ALIAS
+
+READ_ALIASES = {DEFAULT_DB_ALIAS, "replica"}
+
+
+class PrimaryReplicaRouter:
+    """
+    Keep everything on the primary unless a query opts in to the replica
+    with `.using(read_alias())`, so writes, auth and imports never read
+    stale rows. The replica is a physical copy of the primary: objects
+    from either may be related, and migrations only run on the primary.
+    """
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if {obj1._state.db, obj2._state.db} <= READ_ALIASES:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
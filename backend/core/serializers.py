@@ -0,0 +1,8 @@
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from .tokens import CompanyRefreshToken
+
+
+class CompanyTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refresh (and rotate) `CompanyRefreshToken`s, checking revocation via its filter."""
+
+    token_class = CompanyRefreshToken
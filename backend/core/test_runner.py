@@ -0,0 +1,58 @@
+"""
+Test runner creating test databases from cached migrated templates.
+
+Django normally creates an empty test database and runs every migration
+on each test run. `TemplateTestRunner` instead builds a template database
+once per set of migrations and fixture files (see `core.dbtemplates`),
+with the COPY fixtures of every app already loaded, and has Django create
+the test database from it (the `TEST["TEMPLATE"]` setting) without
+migrating. With `--parallel`, Django clones that database once per worker
+as usual, so adding workers costs a copy each, not a migration run.
+
+Fixture rows are shared by every test. `TestCase` tests roll back their
+changes, but `TransactionTestCase` tests truncate all tables when they
+finish; Django runs those last.
+"""
+
+from django.db import connections
+from django.test.runner import DiscoverRunner
+from django.test.utils import get_unique_databases_and_mirrors
+from .dbtemplates import (
+    build_template,
+    copy_fixture_files,
+    database_exists,
+    drop_stale_templates,
+    load_copy_fixtures,
+    template_name,
+)
+
+
+class TemplateTestRunner(DiscoverRunner):
+    def setup_databases(self, **kwargs):
+        test_databases, _ = get_unique_databases_and_mirrors(kwargs.get("aliases"))
+        fixtures = copy_fixture_files()
+        for _, aliases in test_databases.values():
+            alias = sorted(aliases)[0]
+            connection = connections[alias]
+            if connection.vendor != "postgresql":
+                continue
+            test_name = connection.creation._get_test_db_name()
+            template = template_name(test_name, "fixtures" if fixtures else "", fixtures)
+            with connection._nodb_cursor() as cursor:
+                if not database_exists(cursor, template):
+                    self.log(f"Building test template {template} for alias {alias!r}...")
+                    build_template(
+                        cursor,
+                        template,
+                        populate=lambda: load_copy_fixtures(fixtures, alias),
+                        alias=alias,
+                    )
+                drop_stale_templates(cursor, test_name, keep=[template])
+            for alias in aliases:
+                test_settings = connections[alias].settings_dict["TEST"]
+                test_settings["TEMPLATE"] = template
+                if not self.keepdb:
+                    # The template is migrated already. A kept database may
+                    # be older than the migrations, so that one still migrates.
+                    test_settings["MIGRATE"] = False
+        return super().setup_databases(**kwargs)
@@ -1,5 +1,38 @@
 # core/tests.py
-from django.test import TestCase
+import asyncio
+import io
+import json
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import SkipTest, mock, skipUnless
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from rest_framework import serializers
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+from google.auth import crypt, jwt as google_jwt
+from .authentication import CompanyJWTAuthentication, CompanyTokenUser
+from .google_auth import GoogleCertificates, verify_google_id_token
+from .hashers import HashingPoolFull, PasswordHashingPool
+from .logging import DroppingQueueHandler, JsonFormatter
+from .metrics import observe_db_pools, observe_ingest_batch
+from .throttling import AuthIPThrottle
+from .tokens import BloomFilter, CompanyRefreshToken, revocation_filter
+from .db import read_alias, replica_lag, run_cancellable
+from .dbtemplates import seed_files, template_name
+from .profiling import current_stats, time_query
+from .middleware import CompressionMiddleware, RequestProfilingMiddleware, brotli
 from .models import CustomUser
 
 class CustomUserModelTest(TestCase):
@@ -33,3 +66,460 @@ class CustomUserModelTest(TestCase):
         self.assertEqual(user.first_name, 'Test')
         self.assertEqual(user.last_name, 'User')
 
+
+class CompressionMiddlewareTest(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.middleware = CompressionMiddleware(lambda request: None)
+
+    def make_response(self, content_type='application/json'):
+        return HttpResponse(b'{"value": 1.0}' * 100, content_type=content_type)
+
+    def test_brotli_preferred_for_api_responses(self):
+        if brotli is None:
+            self.skipTest('brotli is not installed')
+        request = self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip, br')
+        response = self.middleware.process_response(request, self.make_response())
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), b'{"value": 1.0}' * 100)
+
+    def test_html_keeps_gzip(self):
+        request = self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip, br')
+        response = self.middleware.process_response(request, self.make_response('text/html'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_gzip_fallback(self):
+        request = self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip')
+        response = self.middleware.process_response(request, self.make_response())
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+
+class RunCancellableTest(SimpleTestCase):
+    async def test_cancelling_the_view_cancels_the_query(self):
+        query_cancelled = threading.Event()
+        query_started = threading.Event()
+        connection = mock.Mock()
+        connection.connection.cancel.side_effect = query_cancelled.set
+
+        def slow_query():
+            query_started.set()
+            query_cancelled.wait(5)
+
+        with mock.patch('core.db.connections', {'default': connection}):
+            task = asyncio.create_task(run_cancellable(slow_query))
+            await asyncio.to_thread(query_started.wait, 5)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+        connection.connection.cancel.assert_called_once_with()
+
+
+class ReadAliasTest(SimpleTestCase):
+    def test_falls_back_to_primary(self):
+        with mock.patch('core.db.replica_lag', return_value=None):
+            self.assertEqual(read_alias(), 'default')
+        with mock.patch('core.db.replica_lag', return_value=45.0):
+            self.assertEqual(read_alias(), 'default')
+
+    def test_fresh_reads_need_caught_up_replica(self):
+        with mock.patch('core.db.replica_lag', return_value=0.5):
+            self.assertEqual(read_alias(), 'replica')
+            self.assertEqual(read_alias(max_lag=0), 'default')
+
+
+@skipUnless('replica' in settings.DATABASES, 'POSTGRES_REPLICA_HOST is not set')
+class ReplicaLagTest(TestCase):
+    databases = {'default', 'replica'}
+
+    def test_replica_lag_is_measured(self):
+        self.assertIsInstance(replica_lag(), float)
+
+
+class CompanyTokenUserTest(SimpleTestCase):
+    def token_user(self, **claims):
+        token = AccessToken()
+        token['user_id'] = 7
+        for claim, value in claims.items():
+            token[claim] = value
+        return CompanyTokenUser(token)
+
+    def test_company_and_role_come_from_cached_user(self):
+        # Stale claims of tokens issued before the change are ignored.
+        user = self.token_user(role='manager', company_id=3)
+        full_user = CustomUser(id=7, email='user@example.com', role='analyst', company_id=None)
+        with mock.patch('core.authentication.get_cached_user', return_value=full_user) as get_cached_user:
+            self.assertEqual((user.id, user.role, user.company_id), (7, 'analyst', None))
+            self.assertEqual(user.email, 'user@example.com')
+        get_cached_user.assert_called_once_with(7)
+
+    def test_inactive_user_is_rejected(self):
+        token = AccessToken()
+        token['user_id'] = 7
+        inactive = CustomUser(id=7, is_active=False)
+        with mock.patch('core.authentication.get_cached_user', return_value=inactive):
+            with self.assertRaises(AuthenticationFailed) as raised:
+                CompanyJWTAuthentication().get_user(token)
+        self.assertEqual(raised.exception.get_codes(), 'user_inactive')
+
+
+class DeactivatedUserTest(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='leaving', password='password123')
+        access = CompanyRefreshToken.for_user(self.user).access_token
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {access}'
+
+    def test_deactivation_rejects_existing_tokens(self):
+        self.assertEqual(self.client.get('/api/core/session/').status_code, 200)  # caches the user
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/core/session/').status_code, 401)
+
+
+def generate_signing_key(key_id):
+    """An RSA signer and the matching self-signed certificate (PEM)."""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.x509.oid import NameOID
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, key_id)])
+    now = datetime.now(timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name)
+        .public_key(key.public_key()).serial_number(1)
+        .not_valid_before(now).not_valid_after(now + timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    private_pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    signer = crypt.RSASigner.from_string(private_pem, key_id=key_id)
+    return signer, certificate.public_bytes(serialization.Encoding.PEM).decode()
+
+
+class GoogleCertificatesTest(SimpleTestCase):
+    """Verifies tokens against a local stub of Google's certificate endpoint."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        try:
+            cls.signer, certificate = generate_signing_key('key-1')
+            cls.rotated_signer, cls.rotated_certificate = generate_signing_key('key-2')
+        except ImportError:
+            raise SkipTest('cryptography is not installed')
+        cls.served = {'key-1': certificate}
+        served = cls.served
+
+        class CertificatesHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = json.dumps(served).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Cache-Control', 'public, max-age=3600')
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), CertificatesHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f'http://127.0.0.1:{cls.server.server_port}/certs'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def id_token(self, signer, **claims):
+        now = int(time.time())
+        payload = {
+            'iss': 'https://accounts.google.com', 'aud': 'client-id',
+            'email': 'user@example.com', 'iat': now, 'exp': now + 300, **claims,
+        }
+        return google_jwt.encode(signer, payload)
+
+    def test_certificates_fetched_once_per_rotation(self):
+        certificates = GoogleCertificates(url=self.url)
+        for _ in range(3):
+            claims = verify_google_id_token(self.id_token(self.signer), 'client-id', certificates)
+            self.assertEqual(claims['email'], 'user@example.com')
+        self.assertEqual(certificates.fetches, 1)
+
+        self.served['key-2'] = self.rotated_certificate
+        later = time.monotonic() + 120
+        with mock.patch('core.google_auth.monotonic', return_value=later):
+            verify_google_id_token(self.id_token(self.rotated_signer), 'client-id', certificates)
+            self.assertEqual(certificates.fetches, 2)
+
+            # Unknown key ids don't refetch again right after a rotation.
+            forged, _ = generate_signing_key('key-3')
+            with self.assertRaises(ValueError):
+                verify_google_id_token(self.id_token(forged), 'client-id', certificates)
+            self.assertEqual(certificates.fetches, 2)
+
+    def test_rejects_wrong_audience_and_issuer(self):
+        certificates = GoogleCertificates(url=self.url)
+        with self.assertRaises(ValueError):
+            verify_google_id_token(self.id_token(self.signer, aud='other'), 'client-id', certificates)
+        with self.assertRaises(ValueError):
+            verify_google_id_token(self.id_token(self.signer, iss='evil.example.com'), 'client-id', certificates)
+
+
+class BloomFilterTest(SimpleTestCase):
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(capacity=10_000, error_rate=0.001)
+        members = [f'jti-{i}' for i in range(10_000)]
+        for member in members:
+            bloom.add(member)
+        self.assertTrue(all(member in bloom for member in members))
+        false_positives = sum(f'other-{i}' in bloom for i in range(10_000))
+        self.assertLess(false_positives, 50)
+
+
+class TokenRevocationTest(TestCase):
+    def setUp(self):
+        revocation_filter.reset()
+        self.user = CustomUser.objects.create_user(username='rotating', password='password123')
+
+    def test_blacklisted_token_is_rejected(self):
+        token = CompanyRefreshToken.for_user(self.user)
+        CompanyRefreshToken(str(token))  # warms the filter
+        token.blacklist()
+        with self.assertRaises(TokenError):
+            CompanyRefreshToken(str(token))
+
+    def test_prune_tokens_deletes_expired(self):
+        expired = CompanyRefreshToken.for_user(self.user)
+        expired.blacklist()
+        CompanyRefreshToken.for_user(self.user)
+        OutstandingToken.objects.filter(jti=expired['jti']).update(
+            expires_at=datetime.now(timezone.utc) - timedelta(days=1)
+        )
+        call_command('prune_tokens', batch_size=1, stdout=io.StringIO())
+        self.assertEqual(OutstandingToken.objects.count(), 1)
+
+
+class AuthLoadSheddingTest(SimpleTestCase):
+    def test_token_bucket_per_ip(self):
+        class Throttle(AuthIPThrottle):
+            pass
+
+        factory = RequestFactory()
+        first = factory.post('/api/core/login/', REMOTE_ADDR='10.0.0.1')
+        second = factory.post('/api/core/login/', REMOTE_ADDR='10.0.0.2')
+        with self.settings(REST_FRAMEWORK={'DEFAULT_THROTTLE_RATES': {'auth_ip': '2/min'}}):
+            throttle = Throttle()
+            self.assertEqual(
+                [throttle.allow_request(first, None) for _ in range(3)], [True, True, False]
+            )
+            self.assertAlmostEqual(throttle.wait(), 30, delta=1)
+            self.assertTrue(throttle.allow_request(second, None))
+
+    def test_hashing_pool_rejects_when_full(self):
+        pool = PasswordHashingPool(workers=1, queue=0)
+        started, release = threading.Event(), threading.Event()
+
+        def slow_hash():
+            started.set()
+            release.wait(5)
+            return 'hash'
+
+        thread = threading.Thread(target=pool.run, args=(slow_hash,))
+        thread.start()
+        started.wait(5)
+        with self.assertRaises(HashingPoolFull):
+            pool.run(slow_hash)
+        release.set()
+        thread.join()
+        self.assertEqual(pool.run(lambda: 'next'), 'next')
+
+
+class LoginTest(TestCase):
+    def setUp(self):
+        self.pool = PasswordHashingPool(workers=1, queue=0)
+        patcher = mock.patch('core.views.password_hashing_pool', self.pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        CustomUser.objects.create_user(username='user@example.com', password='password123')
+
+    def login(self, password='password123'):
+        return self.client.post(
+            '/api/core/login/', {'email': 'user@example.com', 'password': password},
+            content_type='application/json',
+        )
+
+    def test_login_checks_password_on_pool(self):
+        with mock.patch.object(self.pool, 'run', wraps=self.pool.run) as run:
+            response = self.login()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.json()['tokens'])
+        run.assert_called_once()
+        self.assertEqual(self.login('wrong').status_code, 401)
+
+    def test_full_pool_answers_503(self):
+        started, release = threading.Event(), threading.Event()
+        busy = threading.Thread(target=self.pool.run, args=(lambda: started.set() or release.wait(5),))
+        busy.start()
+        started.wait(5)
+        try:
+            response = self.login()
+        finally:
+            release.set()
+            busy.join()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+
+class RequestProfilingMiddlewareTest(SimpleTestCase):
+    def view(self, request):
+        # Stand-in for two queries going through the connection wrapper.
+        for _ in range(2):
+            time_query(lambda *args: None, 'SELECT 1', None, False, {})
+        return HttpResponse(b'x' * 300)
+
+    def test_server_timing_and_log(self):
+        middleware = RequestProfilingMiddleware(self.view)
+        with self.assertLogs('core.profiling', 'INFO') as logs:
+            response = middleware(RequestFactory().get('/api/farms/assets/'))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="2 queries", serializer;dur=0.0, render;dur=0.0, total;dur=[\d.]+$')
+        record = logs.records[0]
+        self.assertEqual((record.db_queries, record.response_bytes, record.status), (2, 300, 200))
+        self.assertIsNone(current_stats.get())
+
+    def test_slow_sampled_request_writes_profile(self):
+        with tempfile.TemporaryDirectory() as profile_dir, self.settings(
+            REQUEST_PROFILING_SLOW_MS=0,
+            REQUEST_PROFILING_SAMPLE_RATE=1.0,
+            REQUEST_PROFILING_DIR=profile_dir,
+        ):
+            middleware = RequestProfilingMiddleware(self.view)
+            with self.assertLogs('core.profiling', 'WARNING') as logs:
+                middleware(RequestFactory().get('/api/farms/assets/'))
+            self.assertTrue(os.path.exists(logs.records[0].profile))
+
+    def test_concurrent_sampled_request_is_measured_without_cprofile(self):
+        def view(request):
+            # A second sampled request while this one holds the profiler.
+            inner = inner_middleware(RequestFactory().get('/api/core/session/'))
+            return HttpResponse(inner.status_code)
+
+        with tempfile.TemporaryDirectory() as profile_dir, self.settings(
+            REQUEST_PROFILING_SLOW_MS=0,
+            REQUEST_PROFILING_SAMPLE_RATE=1.0,
+            REQUEST_PROFILING_DIR=profile_dir,
+        ), mock.patch('core.middleware.pyinstrument', None):
+            inner_middleware = RequestProfilingMiddleware(self.view)
+            with self.assertLogs('core.profiling', 'WARNING') as logs:
+                response = RequestProfilingMiddleware(view)(RequestFactory().get('/api/farms/assets/'))
+        self.assertEqual(response.content, b'200')
+        inner, outer = logs.records
+        self.assertIsNone(inner.profile)
+        self.assertTrue(outer.profile)
+
+    def test_serializer_time(self):
+        class SlowSerializer(serializers.Serializer):
+            def to_representation(self, instance):
+                time.sleep(0.01)
+                return {'value': instance}
+
+        def view(request):
+            return HttpResponse(json.dumps(SlowSerializer([1, 2], many=True).data))
+
+        with self.assertLogs('core.profiling', 'INFO') as logs:
+            RequestProfilingMiddleware(view)(RequestFactory().get('/api/farms/assets/'))
+        self.assertGreaterEqual(logs.records[0].serializer_ms, 20)
+
+
+class MetricsEndpointTest(SimpleTestCase):
+    def test_exposes_request_latency_per_route(self):
+        self.client.get('/metrics')
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            b'firmaboard_http_request_duration_seconds_count{method="GET",route="metrics",status="200"}',
+            response.content,
+        )
+
+    def test_pools_sampled_at_scrape_without_opening_new_ones(self):
+        wrapper = connections['default']
+        pools = getattr(wrapper, '_connection_pools', None)
+        if pools is None:
+            self.skipTest('The default database is not PostgreSQL')
+        pool = mock.Mock()
+        pool.get_stats.return_value = {'pool_size': 5, 'pool_available': 3, 'requests_waiting': 2}
+        with mock.patch.dict(pools, {'default': pool}, clear=True):
+            content = self.client.get('/metrics').content
+            self.assertEqual(set(pools), {'default'})
+        self.assertIn(b'firmaboard_db_pool_connections{alias="default",state="used"} 2.0', content)
+        self.assertIn(b'firmaboard_db_pool_waiting_requests{alias="default"} 2.0', content)
+        # Pools Django hasn't opened yet stay unopened.
+        with mock.patch.dict(pools, {}, clear=True):
+            observe_db_pools()
+            self.assertEqual(pools, {})
+
+    def test_ingest_labels_are_bounded(self):
+        observe_ingest_batch('create_test_data', 'wind', 144, duration=0.2)
+        self.assertIn(
+            b'firmaboard_ingest_rows_total{farm_type="wind",source="create_test_data"}',
+            self.client.get('/metrics').content,
+        )
+
+    def test_token_required_when_configured(self):
+        with self.settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get('/metrics').status_code, 401)
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+            self.assertEqual(response.status_code, 200)
+
+
+class QueuedLoggingTest(SimpleTestCase):
+    def test_json_formatter_includes_extra_fields(self):
+        record = logging.makeLogRecord({
+            'name': 'core.profiling', 'levelno': logging.INFO, 'levelname': 'INFO',
+            'msg': 'GET %s', 'args': ('/metrics',), 'db_queries': 2,
+        })
+        entry = json.loads(JsonFormatter().format(record))
+        self.assertEqual(
+            (entry['logger'], entry['message'], entry['db_queries']),
+            ('core.profiling', 'GET /metrics', 2),
+        )
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+        dropped = DroppingQueueHandler.dropped
+        for _ in range(3):
+            handler.handle(logging.makeLogRecord({'msg': 'x'}))
+        self.assertEqual(DroppingQueueHandler.dropped - dropped, 2)
+
+    def test_queued_exception_keeps_traceback_field(self):
+        records = queue.Queue()
+        logger = logging.getLogger('core.tests.queued')
+        logger.addHandler(DroppingQueueHandler(records))
+        logger.propagate = False
+        self.addCleanup(logger.handlers.clear)
+        try:
+            raise ValueError('bad row')
+        except ValueError:
+            logger.exception('Import of %s failed', 'upload.csv')
+        entry = json.loads(JsonFormatter().format(records.get_nowait()))
+        self.assertEqual(entry['message'], 'Import of upload.csv failed')
+        self.assertTrue(entry['exc_info'].startswith('Traceback (most recent call last):'))
+        self.assertIn('ValueError: bad row', entry['exc_info'])
+
+
+class TemplateNameTest(SimpleTestCase):
+    def test_keyed_by_migrations_and_seed_sources(self):
+        plain = template_name('firmaboard')
+        self.assertRegex(plain, r'^firmaboard_tpl_[0-9a-f]{12}$')
+        self.assertEqual(template_name('firmaboard'), plain)
+        seeded = template_name('firmaboard', 'seeded', seed_files())
+        self.assertNotEqual(seeded.removesuffix('_seeded'), plain)
+
+    def test_fits_postgres_identifier_limit(self):
+        self.assertEqual(len(template_name('x' * 100, 'seeded')), 63)
@@ -0,0 +1,100 @@
+import threading
+import time
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+
+class TokenBucket:
+    """Tokens left for one key and when they were last refilled."""
+
+    __slots__ = ("tokens", "updated_at")
+
+    def __init__(self, capacity, now):
+        self.tokens = capacity
+        self.updated_at = now
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    In-process token bucket limiter. Allows bursts of up to N requests per
+    key and refills at N per period, with the rate taken from
+    `DEFAULT_THROTTLE_RATES[scope]` in DRF's '10/min' format.
+
+    Buckets live in the worker's memory, so no cache round trip is added
+    to the requests being protected; limits apply per worker process.
+    """
+
+    scope = None
+    max_keys = 100_000
+    _buckets = None
+    _lock = threading.Lock()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._buckets = {}
+
+    def __init__(self):
+        num, period = api_settings.DEFAULT_THROTTLE_RATES[self.scope].split("/")
+        duration = {"s": 1, "m": 60, "h": 3600, "d": 86400}[period[0]]
+        self.capacity = int(num)
+        self.refill_per_second = self.capacity / duration
+        self._wait = None
+
+    def get_key(self, request):
+        raise NotImplementedError(".get_key() must be overridden")
+
+    def allow_request(self, request, view):
+        key = self.get_key(request)
+        if key is None:
+            return True
+
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_keys:
+                    self._evict_full(now)
+                bucket = self._buckets[key] = TokenBucket(self.capacity, now)
+            bucket.tokens = min(
+                self.capacity,
+                bucket.tokens + (now - bucket.updated_at) * self.refill_per_second,
+            )
+            bucket.updated_at = now
+            if bucket.tokens >= 1:
+                bucket.tokens -= 1
+                return True
+            self._wait = (1 - bucket.tokens) / self.refill_per_second
+            return False
+
+    def _evict_full(self, now):
+        # Buckets that would have refilled completely carry no state.
+        refill_time = self.capacity / self.refill_per_second
+        for key, bucket in list(self._buckets.items()):
+            if now - bucket.updated_at >= refill_time:
+                del self._buckets[key]
+        if len(self._buckets) >= self.max_keys:
+            self._buckets.clear()
+
+    def wait(self):
+        return self._wait
+
+
+class AuthIPThrottle(TokenBucketThrottle):
+    """Limits login and registration attempts per client IP."""
+
+    scope = "auth_ip"
+
+    def get_key(self, request):
+        return self.get_ident(request)
+
+
+class AuthUserThrottle(TokenBucketThrottle):
+    """Limits login attempts per account, whichever IPs they come from."""
+
+    scope = "auth_user"
+
+    def get_key(self, request):
+        email = request.data.get("email")
+        if not isinstance(email, str) or not email:
+            return None
+        return email.strip().lower()
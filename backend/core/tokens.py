@@ -0,0 +1,129 @@
+import math
+import threading
+from hashlib import blake2b
+from time import monotonic
+from django.conf import settings
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from .metrics import record_cache_lookup
+
+REVOCATION_FILTER_CAPACITY = getattr(settings, "TOKEN_REVOCATION_FILTER_CAPACITY", 1_000_000)
+REVOCATION_FILTER_ERROR_RATE = 0.001
+# Ids skipped by the blacklist sequence may belong to transactions that
+# have not committed yet, so small gaps are re-read for a while.
+REVOCATION_GAP_RECHECK_SECONDS = 60
+REVOCATION_MAX_GAP = 1000
+
+
+class BloomFilter:
+    """Fixed-size set membership with false positives but no false negatives."""
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        digest = blake2b(value.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8]), int.from_bytes(digest[8:]) | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(value)
+        )
+
+
+class RevocationFilter:
+    """
+    Per-process Bloom filter of blacklisted refresh token ids, so checking a
+    token that was never revoked (nearly every refresh) skips the join on
+    the blacklist tables.
+
+    Before each check, rows blacklisted since the last check (by any
+    process) are read by primary key, which stays cheap however large the
+    table grows; ids skipped in between are re-read until their inserts
+    have surely committed. Tokens the filter may contain are confirmed in
+    the database. Pruned tokens stay in the filter until it is rebuilt, which
+    only costs false positives: they fail the expiry check first.
+    """
+
+    def __init__(self, capacity=REVOCATION_FILTER_CAPACITY, error_rate=REVOCATION_FILTER_ERROR_RATE):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._filter = None
+        self._last_id = 0
+        self._gaps = {}  # skipped id -> when it was first seen missing
+        self._lock = threading.Lock()
+
+    def _sync(self):
+        if self._filter is None or self._filter.count >= self._filter.capacity:
+            # (Re)build from scratch, growing once the filter is full.
+            capacity = max(self.capacity, 2 * BlacklistedToken.objects.count())
+            self._filter = BloomFilter(capacity, self.error_rate)
+            self._last_id = 0
+            self._gaps = {}
+
+        now = monotonic()
+        self._gaps = {
+            row_id: seen for row_id, seen in self._gaps.items()
+            if now - seen < REVOCATION_GAP_RECHECK_SECONDS
+        }
+        new_rows = (
+            BlacklistedToken.objects.filter(Q(id__gt=self._last_id) | Q(id__in=list(self._gaps)))
+            .order_by("id")
+            .values_list("id", "token__jti")
+            .iterator(chunk_size=10_000)
+        )
+        for row_id, jti in new_rows:
+            self._filter.add(jti)
+            self._gaps.pop(row_id, None)
+            if row_id > self._last_id:
+                # Large gaps are deleted (pruned) rows, not pending inserts.
+                if row_id - self._last_id - 1 <= REVOCATION_MAX_GAP:
+                    self._gaps.update(dict.fromkeys(range(self._last_id + 1, row_id), now))
+                self._last_id = row_id
+
+    def is_revoked(self, jti):
+        with self._lock:
+            self._sync()
+            maybe_revoked = jti in self._filter
+        # A hit is a check answered without querying the blacklist.
+        record_cache_lookup("revocation_filter", not maybe_revoked)
+        if not maybe_revoked:
+            return False
+        return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+    def reset(self):
+        with self._lock:
+            self._filter = None
+            self._last_id = 0
+            self._gaps = {}
+
+
+revocation_filter = RevocationFilter()
+
+
+class CompanyRefreshToken(RefreshToken):
+    """
+    Refresh token whose blacklist checks go through `revocation_filter`.
+    It carries no role or company claims: those are read from the user on
+    each request (see `core.authentication.CompanyTokenUser`), so they
+    can't outlive a change for as long as rotated refresh tokens live.
+    """
+
+    def check_blacklist(self):
+        if revocation_filter.is_revoked(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
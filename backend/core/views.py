@@ -1,20 +1,23 @@
 from django.shortcuts import render
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes, schema
+from rest_framework.decorators import api_view, permission_classes, schema, throttle_classes
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from django.contrib.auth import get_user_model, authenticate
+from django.contrib.auth import get_user_model
 from django.db import transaction
-from rest_framework_simplejwt.tokens import RefreshToken
 from farms.models import Company
 from django.conf import settings
 from rest_framework.reverse import reverse
 from rest_framework.schemas import AutoSchema
 import logging
 from rest_framework_simplejwt.exceptions import TokenError
-from rest_framework_simplejwt.tokens import RefreshToken, TokenError
-from google.oauth2 import id_token as google_id_token
-from google.auth.transport import requests as google_requests
+from .google_auth import verify_google_id_token
+from .hashers import HashingPoolFull, password_hashing_pool
+from .metrics import render_metrics
+from .throttling import AuthIPThrottle, AuthUserThrottle
+from .tokens import CompanyRefreshToken
 
 User = get_user_model()
 
@@ -25,7 +28,7 @@ def get_tokens_for_user(user, remember_me=False):
     """
     Generate JWT tokens for the given user with different lifetimes based on remember_me
     """
-    refresh = RefreshToken.for_user(user)
+    refresh = CompanyRefreshToken.for_user(user)
     
     # Set token lifetimes based on remember_me
     if remember_me:
@@ -60,6 +63,7 @@ def api_root(request):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([AuthIPThrottle])
 @schema(AutoSchema())
 def register_user(request):
     """
@@ -165,6 +169,7 @@ def register_user(request):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([AuthIPThrottle, AuthUserThrottle])
 @schema(AutoSchema())
 def login_user(request):
     """
@@ -206,7 +211,14 @@ def login_user(request):
             'error': 'Please provide both email and password'
         }, status=status.HTTP_400_BAD_REQUEST)
 
-    user = authenticate(username=email, password=password)
+    try:
+        # Password hashing runs on a bounded pool so login storms can't
+        # starve other requests of CPU
+        user = password_hashing_pool.authenticate(email, password)
+    except HashingPoolFull:
+        return Response({
+            'error': 'Too many login attempts in progress, please retry shortly'
+        }, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '1'})
 
     if user is not None:
         tokens = get_tokens_for_user(user, remember_me)
@@ -258,7 +270,7 @@ def logout_user(request):
     
     try:
         # Try to decode the token first
-        token = RefreshToken(refresh_token)
+        token = CompanyRefreshToken(refresh_token)
         
         # Check if token belongs to the current user
         if token.get('user_id') != request.user.id:
@@ -310,25 +322,29 @@ def get_user_session(request):
     }
     ```
     """
+    user = request.user
+    company = user.company
+
     company_payload = None
-    if getattr(request.user, 'company', None):
-        company_payload = { 'name': request.user.company.name }
+    if company is not None:
+        company_payload = { 'name': company.name }
 
     return Response({
         'isAuthenticated': True,
         'user': {
-            'id': request.user.id,
-            'email': request.user.email,
-            'first_name': request.user.first_name,
-            'last_name': request.user.last_name,
-            'role': request.user.role,
+            'id': user.id,
+            'email': user.email,
+            'first_name': user.first_name,
+            'last_name': user.last_name,
+            'role': user.role,
             'company': company_payload,
         },
-        'onboarding_required': request.user.company is None,
+        'onboarding_required': company is None,
     }, status=status.HTTP_200_OK)
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([AuthIPThrottle])
 @schema(AutoSchema())
 def google_oauth_login(request):
     """
@@ -352,8 +368,7 @@ def google_oauth_login(request):
         return Response({'error': 'OAuth not configured'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     try:
-        request_adapter = google_requests.Request()
-        idinfo = google_id_token.verify_oauth2_token(id_token_value, request_adapter, audience=client_id)
+        idinfo = verify_google_id_token(id_token_value, client_id)
 
         # Basic validation
         issuer = idinfo.get('iss')
@@ -454,7 +469,8 @@ def setup_company_profile(request):
     """
     try:
         with transaction.atomic():
-            user = request.user
+            # request.user may be a token user; fetch the row to update it
+            user = User.objects.select_for_update().get(pk=request.user.id)
 
             # Validate company payload
             company_data = request.data.get('company')
@@ -498,7 +514,8 @@ def setup_company_profile(request):
                     'last_name': user.last_name,
                     'role': user.role,
                     'company': { 'name': company.name },
-                }
+                },
+                'tokens': get_tokens_for_user(user),
             }, status=status.HTTP_200_OK)
     except Exception as e:
         logger.error(f"Error during company profile setup: {str(e)}")
@@ -550,3 +567,18 @@ def complete_onboarding(request):
         return Response({
             'error': str(e)
         }, status=status.HTTP_400_BAD_REQUEST)
+
+
+def metrics(request):
+    """
+    Prometheus scrape endpoint, aggregated across worker processes (see
+    `core.metrics`). When `METRICS_TOKEN` is set, scrapers must send it as
+    `Authorization: Bearer <token>`.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token and not constant_time_compare(
+        request.headers.get('Authorization', ''), f'Bearer {token}'
+    ):
+        return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+    body, content_type = render_metrics()
+    return HttpResponse(body, content_type=content_type)
@@ -47,7 +47,7 @@ def upload_file(request):
             content_type=uploaded_file.content_type or "application/octet-stream",
             size=uploaded_file.size,
             data=file_bytes,
-            uploaded_by=request.user,
+            uploaded_by_id=request.user.id,
             import_job_id=import_job_id,
         )
 
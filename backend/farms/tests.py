@@ -1,3 +1,34 @@
-from django.test import TestCase
+import asyncio
+import threading
+from unittest import mock
+from django.test import RequestFactory, SimpleTestCase
+from .views import asset_list_async
 
-# Create your tests here.
+
+class AsyncAssetListTest(SimpleTestCase):
+    async def test_disconnect_cancels_query_on_alias_used(self):
+        started, cancelled = threading.Event(), threading.Event()
+        aliases = []
+        connections = {'default': mock.Mock(), 'replica': mock.Mock()}
+        connections['replica'].connection.cancel.side_effect = cancelled.set
+
+        def slow_query(params, using):
+            aliases.append(using)
+            started.set()
+            cancelled.wait(5)
+
+        request = RequestFactory().get('/api/farms/assets/async/')
+        with (
+            mock.patch('farms.views.read_alias', return_value='replica'),
+            mock.patch('farms.views.query_assets', slow_query),
+            mock.patch('core.db.connections', connections),
+            mock.patch('core.authentication.aauthenticate', return_value=mock.Mock()),
+        ):
+            task = asyncio.create_task(asset_list_async(request))
+            await asyncio.to_thread(started.wait, 5)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+        self.assertEqual(aliases, ['replica'])
+        connections['replica'].connection.cancel.assert_called_once_with()
+        connections['default'].connection.cancel.assert_not_called()
@@ -3,4 +3,5 @@ from . import views
 
 urlpatterns = [
     path('assets/', views.asset_list, name='asset-list'),
+    path('assets/async/', views.asset_list_async, name='asset-list-async'),
 ] 
\ No newline at end of file
@@ -1,8 +1,13 @@
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
 from django.shortcuts import render
+from django.views.decorators.http import require_GET
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.db.models import Q
+from core.authentication import async_authentication_required
+from core.db import read_alias, run_cancellable
 from .models import WindFarm, SolarFarm
 from .serializers import WindFarmAssetSerializer, SolarFarmAssetSerializer
 
@@ -18,10 +23,33 @@ def asset_list(request):
     - type: Optional filter by type ('wind' or 'solar')
     - status: Optional filter by status ('online' or 'offline')
     """
+    return Response(query_assets(request.GET))
+
+
+@require_GET
+@async_authentication_required
+async def asset_list_async(request):
+    """
+    Async variant of `asset_list` with the same query params. The queries
+    run through `run_cancellable`, so they stop when the client disconnects.
+    """
+    # Resolved once, so a disconnect cancels the query on the connection
+    # that actually runs it.
+    using = await sync_to_async(read_alias)(max_lag=0)
+    assets = await run_cancellable(query_assets, request.GET, using, using=using)
+    return JsonResponse(assets, safe=False)
+
+
+def query_assets(params, using=None):
+    """
+    Wind and solar farm assets matching the `asset_list` query params.
+    Their status must be current, so unless a database alias is given they
+    are only read from a replica that has caught up with the primary.
+    """
     # Get query parameters
-    search = request.GET.get('search', '')
-    asset_type = request.GET.get('type', '').lower()
-    status = request.GET.get('status', '').lower()
+    search = params.get('search', '')
+    asset_type = params.get('type', '').lower()
+    status = params.get('status', '').lower()
 
     # Initialize empty lists for assets
     wind_farms = []
@@ -42,20 +70,20 @@ def asset_list(request):
         solar_query &= Q(operational_status=is_operational)
 
     # Fetch assets based on type filter
+    if using is None:
+        using = read_alias(max_lag=0)
     if not asset_type or asset_type == 'wind':
-        wind_farms = WindFarm.objects.filter(wind_query)
+        wind_farms = WindFarm.objects.using(using).filter(wind_query)
         
     if not asset_type or asset_type == 'solar':
-        solar_farms = SolarFarm.objects.filter(solar_query)
+        solar_farms = SolarFarm.objects.using(using).filter(solar_query)
 
     # Serialize the data
     wind_data = WindFarmAssetSerializer(wind_farms, many=True).data
     solar_data = SolarFarmAssetSerializer(solar_farms, many=True).data
 
     # Combine and sort the results by name
-    combined_assets = sorted(
+    return sorted(
         wind_data + solar_data,
         key=lambda x: x['name']
     )
-
-    return Response(combined_assets)
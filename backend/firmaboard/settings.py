@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import copy
 import os
 from pathlib import Path
 from dotenv import load_dotenv
@@ -55,6 +56,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "core.middleware.CompressionMiddleware",
+    "core.middleware.RequestProfilingMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -64,8 +67,22 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Per-request query count, DB/render time and size (core.middleware)
+REQUEST_PROFILING_SLOW_MS = int(os.getenv("REQUEST_PROFILING_SLOW_MS", "500"))
+REQUEST_PROFILING_MAX_QUERIES = int(os.getenv("REQUEST_PROFILING_MAX_QUERIES", "50"))
+# Fraction of requests run under a profiler; slow ones are saved to disk
+REQUEST_PROFILING_SAMPLE_RATE = float(os.getenv("REQUEST_PROFILING_SAMPLE_RATE", "0"))
+REQUEST_PROFILING_DIR = BASE_DIR / "logs" / "profiles"
+
+# Bearer token required by /metrics when set. Multi-process servers also
+# need PROMETHEUS_MULTIPROC_DIR in the environment (see core.metrics).
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
 ROOT_URLCONF = "firmaboard.urls"
 
+# Test databases are cloned from a cached migrated template (core.test_runner)
+TEST_RUNNER = "core.test_runner.TemplateTestRunner"
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -83,6 +100,8 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "firmaboard.wsgi.application"
+# Live dashboard updates (timeseries/live-updates/) need an ASGI server
+ASGI_APPLICATION = "firmaboard.asgi.application"
 
 
 # Database
@@ -100,10 +119,71 @@ DATABASES = {
     }
 }
 
+# Connection reuse, so requests don't each open a new PostgreSQL
+# connection (TCP, TLS and auth):
+# - POSTGRES_POOL=true (default): a psycopg 3 pool per process.
+#   POSTGRES_POOL_MAX_SIZE x processes must stay below max_connections.
+#   MIN_SIZE connections are kept open when idle, and requests wait up to
+#   POSTGRES_POOL_TIMEOUT seconds for a connection.
+# - POSTGRES_POOL=false: one persistent connection per thread, kept for
+#   POSTGRES_CONN_MAX_AGE seconds and checked before reuse. Only use this
+#   under WSGI; ASGI runs each request in a new thread, so the connections
+#   are never reused.
+# The sizes below are unmeasured starting points, not tuned values: the
+# pooled and unpooled latencies haven't been benchmarked yet. To measure
+# them, start the server once with POSTGRES_POOL=true and once with false,
+# and each time run
+#   manage.py loadtest --mix session=1,asset_list=1 --concurrency 20 --output pool-<setting>.json
+# get_user_session only queries when its cached user expires, so it shows
+# the floor; asset_list queries on every request. Repeat with the
+# concurrency the deployment expects; `firmaboard_db_pool_*` on /metrics
+# shows how full the pool gets and how many requests wait for it.
+if os.getenv("POSTGRES_POOL", "true").lower() == "true":
+    DATABASES["default"]["OPTIONS"] = {
+        "pool": {
+            "min_size": int(os.getenv("POSTGRES_POOL_MIN_SIZE", "2")),
+            "max_size": int(os.getenv("POSTGRES_POOL_MAX_SIZE", "10")),
+            "timeout": float(os.getenv("POSTGRES_POOL_TIMEOUT", "10")),
+        },
+    }
+else:
+    DATABASES["default"]["CONN_MAX_AGE"] = int(os.getenv("POSTGRES_CONN_MAX_AGE", "60"))
+    DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+
+# Optional read replica for timeseries analytics and exports (see
+# core.db.read_alias). Writes, auth and imports always use the primary,
+# and reads fall back to it while the replica lags more than
+# POSTGRES_REPLICA_MAX_LAG seconds.
+if os.getenv("POSTGRES_REPLICA_HOST"):
+    DATABASES["replica"] = {
+        **copy.deepcopy(DATABASES["default"]),
+        "HOST": os.getenv("POSTGRES_REPLICA_HOST"),
+        "PORT": os.getenv("POSTGRES_REPLICA_PORT", os.getenv("POSTGRES_PORT")),
+        "TEST": {"MIRROR": "default"},
+    }
+DATABASE_ROUTERS = ["core.routers.PrimaryReplicaRouter"]
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("POSTGRES_REPLICA_MAX_LAG", "30"))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
+# Password hashing cost: PASSWORD_HASH_ITERATIONS overrides Django's PBKDF2
+# default, e.g. lower in development. Hashes with another cost are
+# rehashed on the next login.
+PASSWORD_HASHERS = [
+    "core.hashers.TunablePBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+if os.getenv("PASSWORD_HASH_ITERATIONS"):
+    PASSWORD_HASH_ITERATIONS = int(os.getenv("PASSWORD_HASH_ITERATIONS"))
+# Login password checks run on a bounded pool (core.hashers)
+PASSWORD_HASHING_WORKERS = int(os.getenv("PASSWORD_HASHING_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASHING_QUEUE = int(os.getenv("PASSWORD_HASHING_QUEUE", "32"))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -153,7 +233,9 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # Token users carry role and company claims and load the full
+        # user lazily, see core.authentication.CompanyTokenUser
+        'core.authentication.CompanyJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_RENDERER_CLASSES': [
@@ -168,6 +250,11 @@ REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'rest_framework.schemas.AutoSchema',
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
+    # Token buckets for the login/register views, see core.throttling
+    'DEFAULT_THROTTLE_RATES': {
+        'auth_ip': os.getenv('AUTH_THROTTLE_IP_RATE', '30/min'),
+        'auth_user': os.getenv('AUTH_THROTTLE_USER_RATE', '10/min'),
+    },
 }
 
 # JWT settings
@@ -178,6 +265,7 @@ SIMPLE_JWT = {
     'REMEMBER_ME_REFRESH_TOKEN_LIFETIME': timedelta(days=30),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
+    'TOKEN_REFRESH_SERIALIZER': 'core.serializers.CompanyTokenRefreshSerializer',
     'UPDATE_LAST_LOGIN': True,
     'ALGORITHM': 'HS256',
     'SIGNING_KEY': SECRET_KEY,
@@ -188,7 +276,7 @@ SIMPLE_JWT = {
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
     'JTI_CLAIM': 'jti',
-    'TOKEN_USER_CLASS': 'core.CustomUser',
+    'TOKEN_USER_CLASS': 'core.authentication.CompanyTokenUser',
     'SLIDING_TOKEN_REFRESH_EXP_CLAIM': 'refresh_exp',
     'SLIDING_TOKEN_LIFETIME': timedelta(minutes=60),
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
@@ -219,6 +307,29 @@ _GOOGLE_ALLOWED_DOMAINS = os.getenv("GOOGLE_ALLOWED_DOMAINS", "").strip()
 GOOGLE_ALLOWED_DOMAINS = [d.strip().lower() for d in _GOOGLE_ALLOWED_DOMAINS.split(',') if d.strip()] if _GOOGLE_ALLOWED_DOMAINS else []
 
 # Logging Configuration
+# Log records are queued by request threads and written by a background
+# thread (core.logging). The file is JSON, one record per line, rotated by
+# size, or by time when LOG_ROTATE_WHEN is set (e.g. "midnight").
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN")
+LOG_FILE_HANDLER = {
+    'level': 'INFO',
+    'filename': BASE_DIR / 'logs' / 'firmaboard.log',
+    'formatter': 'json',
+    'backupCount': int(os.getenv("LOG_BACKUP_COUNT", "5")),
+    'encoding': 'utf-8',
+}
+if LOG_ROTATE_WHEN:
+    LOG_FILE_HANDLER.update({
+        'class': 'logging.handlers.TimedRotatingFileHandler',
+        'when': LOG_ROTATE_WHEN,
+        'utc': True,
+    })
+else:
+    LOG_FILE_HANDLER.update({
+        'class': 'logging.handlers.RotatingFileHandler',
+        'maxBytes': int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+    })
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -231,33 +342,41 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'core.logging.JsonFormatter',
+        },
     },
     'handlers': {
-        'file': {
-            'level': 'INFO',
-            'class': 'logging.FileHandler',
-            'filename': BASE_DIR / 'logs' / 'firmaboard.log',
-            'formatter': 'verbose',
-        },
+        'file': LOG_FILE_HANDLER,
         'console': {
             'level': 'DEBUG',
             'class': 'logging.StreamHandler',
             'formatter': 'simple',
         },
+        'queue': {
+            'class': 'core.logging.DroppingQueueHandler',
+            'handlers': ['file', 'console'],
+            'queue': {
+                '()': 'queue.Queue',
+                'maxsize': int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+            },
+            'listener': 'core.logging.BackgroundQueueListener',
+            'respect_handler_level': True,
+        },
     },
     'loggers': {
         'django': {
-            'handlers': ['file', 'console'],
+            'handlers': ['queue'],
             'level': 'INFO',
             'propagate': True,
         },
         'core': {  # This will capture logs from our core app
-            'handlers': ['file', 'console'],
+            'handlers': ['queue'],
             'level': 'INFO',
             'propagate': True,
         },
         'rest_framework_simplejwt': {  # This will capture JWT-related logs
-            'handlers': ['file', 'console'],
+            'handlers': ['queue'],
             'level': 'INFO',
             'propagate': True,
         },
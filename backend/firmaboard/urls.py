@@ -19,12 +19,14 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from core.views import metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/core/', include('core.urls')),
     path('api-auth/', include('rest_framework.urls')),  # REST Framework browsable API
-    # path('api/timeseries/', include('timeseries.urls')),
+    path('api/timeseries/', include('timeseries.urls')),
     path('api/farms/', include('farms.urls')),  # Add farms URLs
     path('api/data-import/', include('data_import.urls')),
+    path('metrics', metrics, name='metrics'),  # Prometheus scrape endpoint
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -1,11 +1,175 @@
+import json
+from datetime import timedelta
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
 from django.contrib.contenttypes.models import ContentType
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
 from .models import WindFarmTimeseries, SolarFarmTimeseries, Alarm
 
+CURSOR_VAR = 'before'
+MAX_NODE_CHOICES = 200
+
+
+def estimate_count(queryset):
+    """
+    Row count of `queryset` without counting: TimescaleDB's
+    `approximate_row_count` for a whole table, else the planner's estimate.
+    """
+    with connections[queryset.db].cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute(
+                "SELECT approximate_row_count(%s::regclass)", [queryset.model._meta.db_table]
+            )
+            return cursor.fetchone()[0]
+        sql, params = queryset.order_by().query.sql_with_params()
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class ApproximateCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        return estimate_count(self.object_list)
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Changelist paging newest to oldest by `(time, id)` instead of by page
+    number: a page starts below the last row of the previous one, so it
+    costs an index range scan however deep it is, where `OFFSET` reads
+    and discards every row before the page.
+    """
+
+    keyset = True
+
+    def get_filters_params(self, params=None):
+        params = super().get_filters_params(params)
+        params.pop(CURSOR_VAR, None)
+        return params
+
+    def parse_cursor(self, value):
+        time, _, pk = value.rpartition('_')
+        time = parse_datetime(time)
+        if time is None or not pk.isdigit():
+            raise IncorrectLookupParameters(f'Invalid {CURSOR_VAR} value: {value}')
+        return time, int(pk)
+
+    def get_results(self, request):
+        self.paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.result_count = self.paginator.count
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.can_show_all = False
+        self.multi_page = False
+
+        queryset = self.queryset
+        self.cursor = request.GET.get(CURSOR_VAR)
+        if self.cursor:
+            time, pk = self.parse_cursor(self.cursor)
+            queryset = queryset.filter(time__lte=time).filter(Q(time__lt=time) | Q(pk__lt=pk))
+        rows = list(queryset[: self.list_per_page + 1])
+        self.result_list = rows[: self.list_per_page]
+
+        self.newest_url = self.get_query_string(remove=[CURSOR_VAR])
+        self.next_url = None
+        if len(rows) > self.list_per_page:
+            last = self.result_list[-1]
+            self.next_url = self.get_query_string(
+                {CURSOR_VAR: f'{last.time.isoformat()}_{last.pk}'}
+            )
+
+
+class TimeRangeFilter(admin.SimpleListFilter):
+    """
+    Always-on time window, so no changelist query scans the whole
+    hypertable. There is deliberately no "All" choice.
+    """
+
+    title = 'time'
+    parameter_name = 'range'
+    default = '24h'
+    ranges = {
+        '1h': ('Last hour', timedelta(hours=1)),
+        '24h': ('Last 24 hours', timedelta(hours=24)),
+        '7d': ('Last 7 days', timedelta(days=7)),
+        '30d': ('Last 30 days', timedelta(days=30)),
+    }
+
+    @classmethod
+    def start(cls, request):
+        value = request.GET.get(cls.parameter_name, cls.default)
+        if value not in cls.ranges:
+            raise IncorrectLookupParameters(f'Invalid time range: {value}')
+        return timezone.now() - cls.ranges[value][1]
+
+    def value(self):
+        return super().value() or self.default
+
+    def lookups(self, request, model_admin):
+        return [(key, label) for key, (label, _) in self.ranges.items()]
+
+    def choices(self, changelist):
+        for lookup, title in self.lookup_choices:
+            yield {
+                'selected': self.value() == lookup,
+                'query_string': changelist.get_query_string(
+                    {self.parameter_name: lookup}, [CURSOR_VAR]
+                ),
+                'display': title,
+            }
+
+    def queryset(self, request, queryset):
+        return queryset.filter(time__gte=self.start(request))
+
+
+class NodeFilter(admin.SimpleListFilter):
+    """
+    Nodes of the selected farm that reported within the time window,
+    rather than every distinct `node_id` in the hypertable.
+    """
+
+    title = 'node'
+    parameter_name = 'node_id'
+
+    def lookups(self, request, model_admin):
+        farm_id = request.GET.get('farm__id__exact', '')
+        if not farm_id.isdigit():
+            return []
+        nodes = (
+            model_admin.model.objects.filter(farm_id=farm_id, time__gte=TimeRangeFilter.start(request))
+            .order_by('node_id')
+            .values_list('node_id', flat=True)
+            .distinct()[:MAX_NODE_CHOICES]
+        )
+        return [(str(node), str(node)) for node in nodes]
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value is None:
+            return queryset
+        if not value.isdigit():
+            raise IncorrectLookupParameters(f'Invalid node: {value}')
+        return queryset.filter(node_id=value)
+
+
 class BaseTimeSeriesAdmin(admin.ModelAdmin):
     """
     Base admin configuration for TimeSeries models.
     Handles common configurations to promote DRY principles.
+
+    Changelists stay fast on hypertables of any size: rows are always
+    limited to a time window, filter choices never scan the table, counts
+    are estimated and pages are fetched by keyset (see `KeysetChangeList`).
     """
     list_display = (
         'time',
@@ -14,10 +178,16 @@ class BaseTimeSeriesAdmin(admin.ModelAdmin):
         'created_at',
         'updated_at',
     )
-    list_filter = ('farm', 'node_id', 'time', 'created_at', 'updated_at')
-    search_fields = ('farm__name', 'node_id')
+    list_filter = (TimeRangeFilter, 'farm', NodeFilter)
     readonly_fields = ('created_at', 'updated_at')
-    ordering = ('-time',)
+    ordering = ('-time', '-id')
+    # Keyset pages follow (time, id); other sort orders would break them.
+    sortable_by = ()
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
 
 @admin.register(WindFarmTimeseries)
 class WindFarmTimeseriesAdmin(BaseTimeSeriesAdmin):
@@ -79,4 +249,4 @@ class AlarmAdmin(admin.ModelAdmin):
 
     def get_queryset(self, request):
         qs = super().get_queryset(request)
-        return qs.select_related('content_type')
+        return qs.with_farms()
@@ -0,0 +1,122 @@
+"""
+Visual downsampling of timeseries for charts.
+
+Both algorithms select existing points instead of averaging them, so
+peaks and troughs survive:
+
+- LTTB (Largest-Triangle-Three-Buckets) keeps the point of each bucket
+  that forms the largest triangle with its neighbours. Best for line charts.
+- M4 keeps the first, last, minimum and maximum point of each bucket, which
+  reproduces a rasterised line chart exactly when one bucket maps to one
+  pixel column.
+
+Missing values (`None`) are ignored when choosing points.
+"""
+
+import numpy as np
+
+DOWNSAMPLING_METHODS = ["lttb", "m4"]
+# Smallest share of the point budget per field: M4 needs four per bucket.
+MIN_POINTS_PER_SHARE = 4
+
+
+def minimum_points(field_count):
+    """Smallest `max_points` `downsample` accepts for `field_count` fields."""
+    # One share per field, plus one for the gaps.
+    return MIN_POINTS_PER_SHARE * (field_count + 1)
+
+
+def lttb_indices(x, y, threshold):
+    """
+    Indices of the `threshold` points selected by LTTB.
+    `x` must be sorted; NaNs in `y` are never selected.
+    """
+    valid = np.flatnonzero(~np.isnan(y))
+    if len(valid) <= threshold or threshold < 3:
+        return valid
+    x, y = x[valid], y[valid]
+
+    # Bucket edges for the points between the fixed first and last point.
+    edges = np.linspace(1, len(x) - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, len(x) - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else len(x)
+        # Average of the next bucket is the third triangle vertex.
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        areas = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+
+    return valid[selected]
+
+
+def m4_indices(x, y, threshold):
+    """
+    Indices of the first, last, min and max point of `threshold // 4`
+    equal-width time buckets. `x` must be sorted; NaNs in `y` are never
+    selected.
+    """
+    valid = np.flatnonzero(~np.isnan(y))
+    if len(valid) <= threshold or threshold < 4:
+        return valid
+    x, y = x[valid], y[valid]
+
+    n_buckets = threshold // 4
+    span = x[-1] - x[0] or 1.0
+    buckets = np.minimum(((x - x[0]) / span * n_buckets).astype(np.int64), n_buckets - 1)
+
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(x)] - 1
+
+    # Sorting by (bucket, y) puts each bucket's min first and max last.
+    by_value = np.lexsort((y, buckets))
+    mins = by_value[starts]
+    maxes = by_value[ends]
+
+    return valid[np.unique(np.concatenate([starts, ends, mins, maxes]))]
+
+
+def downsample(series, max_points, method="lttb"):
+    """
+    Reduce a series dict to at most `max_points` timestamps.
+
+    Each field gets an equal share of the point budget and the union of
+    the selected timestamps is kept, so every returned row still has a
+    value (or `None`) for every field. Rows where every field is `None`,
+    such as gapfilled buckets without data, mark gaps a chart must not
+    draw across: the first row of each gap is kept too, within a share of
+    its own. Raises ValueError when `max_points` is below `minimum_points`.
+    """
+    if len(series["time"]) <= max_points:
+        return series
+
+    fields = [field for field in series if field != "time"]
+    if max_points < minimum_points(len(fields)):
+        raise ValueError(
+            f"max_points must be at least {minimum_points(len(fields))} for {len(fields)} fields"
+        )
+    x = np.fromiter((t.timestamp() for t in series["time"]), dtype=np.float64)
+    values = [np.array(series[field], dtype=np.float64) for field in fields]
+    empty = np.zeros(len(x), dtype=bool)
+    if values:
+        empty = np.logical_and.reduce([np.isnan(y) for y in values])
+    gaps = np.flatnonzero(empty & ~np.r_[False, empty[:-1]])
+
+    budget = max_points // max(len(fields) + (1 if len(gaps) else 0), 1)
+    if len(gaps) > budget:
+        gaps = gaps[np.linspace(0, len(gaps) - 1, budget).astype(np.int64)]
+    select = lttb_indices if method == "lttb" else m4_indices
+    selected = [select(x, y, budget) for y in values]
+    indices = np.unique(np.concatenate([*selected, gaps]))
+    return {
+        column: [column_values[i] for i in indices.tolist()]
+        for column, column_values in series.items()
+    }
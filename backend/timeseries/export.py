@@ -0,0 +1,116 @@
+"""
+Streaming encoders for timeseries exports.
+
+Rows are read through a server-side cursor in fixed size batches and
+encoded batch by batch, so memory stays flat regardless of the range
+being exported.
+
+Under ASGI, Django collects a sync response iterator into a list before
+sending anything, so exports served there go through `iterate_async`.
+"""
+
+import csv
+import io
+from itertools import islice
+from asgiref.sync import sync_to_async
+from django.db import transaction
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Parquet export is optional, see pyproject extras
+    pyarrow = None
+
+EXPORT_BATCH_SIZE = 10_000
+
+
+def iter_batches(queryset, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yield lists of row tuples from a server-side cursor.
+
+    The cursor is opened inside a transaction: outside of one, Django
+    declares it `WITH HOLD` and PostgreSQL materialises the whole result
+    before the first row is sent.
+    """
+    with transaction.atomic(using=queryset.db):
+        rows = queryset.iterator(chunk_size=batch_size)
+        while batch := list(islice(rows, batch_size)):
+            yield batch
+
+
+async def iterate_async(chunks):
+    """
+    Async iterator over the sync iterator `chunks`, advancing it one chunk
+    at a time in the request's sync thread. That thread holds the database
+    connection of the request, so the server-side cursor and transaction
+    of `iter_batches` stay open across chunks; fetching and encoding a batch
+    never blocks the event loop.
+    """
+    advance = sync_to_async(next)
+    try:
+        while (chunk := await advance(chunks, None)) is not None:
+            yield chunk
+    finally:
+        # Also on disconnect: ends the cursor's transaction.
+        await sync_to_async(chunks.close)()
+
+
+def stream_csv(batches, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for batch in batches:
+        writer.writerows(
+            (time.isoformat(), *values) for time, *values in batch
+        )
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only file object whose contents can be taken after each write."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_parquet(batches, columns):
+    """
+    Encode each batch as one Parquet row group and yield the bytes as soon
+    as they are written. The footer is emitted when the batches run out.
+    """
+    schema = pyarrow.schema(
+        [("time", pyarrow.timestamp("us", tz="UTC")), ("node_id", pyarrow.int32())]
+        + [(column, pyarrow.float64()) for column in columns[2:]]
+    )
+    sink = _DrainableSink()
+    with pyarrow.parquet.ParquetWriter(sink, schema, compression="zstd") as writer:
+        for batch in batches:
+            arrays = [
+                pyarrow.array(values, type=field.type)
+                for values, field in zip(zip(*batch), schema)
+            ]
+            writer.write_table(pyarrow.Table.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+EXPORT_FORMATS = {
+    "csv": (stream_csv, "text/csv"),
+    "parquet": (stream_parquet, "application/vnd.apache.parquet"),
+}
@@ -0,0 +1,256 @@
+"""
+Fan-out of live dashboard updates across worker processes.
+
+Ingest code announces committed data with `notify_timeseries_batch` and
+`notify_alarm`, which send a compact summary over PostgreSQL
+`NOTIFY` as part of the ingest transaction, so nothing is announced
+unless the transaction commits. Every ASGI worker runs one
+`NotificationListener` that `LISTEN`s on that channel and hands each
+notification to the worker's `LiveHub`. The hub pushes it to the bounded
+queue of every client subscribed to that farm, so the cost of a new batch
+does not depend on how many dashboards are open or how often they poll.
+"""
+
+import asyncio
+import json
+import logging
+from collections import defaultdict
+import psycopg
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.dateparse import parse_datetime
+from core.metrics import LIVE_SUBSCRIBERS
+
+logger = logging.getLogger(__name__)
+
+LIVE_CHANNEL = "firmaboard_live"
+LIVE_QUEUE_SIZE = getattr(settings, "LIVE_UPDATES_QUEUE_SIZE", 100)
+LIVE_HEARTBEAT_SECONDS = getattr(settings, "LIVE_UPDATES_HEARTBEAT_SECONDS", 15)
+LIVE_RECONNECT_SECONDS = getattr(settings, "LIVE_UPDATES_RECONNECT_SECONDS", 5)
+
+ALARM_FARM_TYPES = {"windfarm": "wind", "solarfarm": "solar"}
+
+
+def farm_key(farm_type, farm_id):
+    return f"{farm_type}:{farm_id}"
+
+
+def encode_event(event_type, payload):
+    data = json.dumps(payload, cls=DjangoJSONEncoder, separators=(",", ":"))
+    return f"event: {event_type}\ndata: {data}\n\n".encode()
+
+
+def merge_batches(pending, summary):
+    """Widen the `pending` batch summary in place to also cover `summary`."""
+    pending["rows"] += summary["rows"]
+    pending["nodes"] = [
+        min(pending["nodes"][0], summary["nodes"][0]),
+        max(pending["nodes"][1], summary["nodes"][1]),
+    ]
+    pending["start"] = min(pending["start"], summary["start"], key=parse_datetime)
+    pending["end"] = max(pending["end"], summary["end"], key=parse_datetime)
+
+
+class Subscription:
+    """
+    One connected client. Its queue is bounded: when a slow client falls
+    behind, the oldest pending message is dropped instead of buffering
+    without limit. Timeseries batches for a farm that are still waiting
+    to be sent are coalesced into one summary covering all of them.
+    """
+
+    def __init__(self, farm_keys, queue_size):
+        self.farm_keys = frozenset(farm_keys)
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        # Farm key -> coalesced batch summary; the queue holds the key.
+        self.pending = {}
+        self.dropped = 0
+
+    def push(self, message):
+        if self.queue.full():
+            oldest = self.queue.get_nowait()
+            if isinstance(oldest, str):
+                self.pending.pop(oldest)
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+    def push_batch(self, key, summary):
+        if key in self.pending:
+            merge_batches(self.pending[key], summary)
+            return
+        self.pending[key] = dict(summary)
+        self.push(key)
+
+    async def get(self):
+        item = await self.queue.get()
+        if isinstance(item, str):
+            return encode_event("timeseries", self.pending.pop(item))
+        return item
+
+
+class LiveHub:
+    def __init__(self, queue_size=LIVE_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)
+
+    @property
+    def subscriber_count(self):
+        return len(set().union(*self._subscribers.values()))
+
+    def subscribe(self, farm_keys):
+        subscription = Subscription(farm_keys, self.queue_size)
+        for key in subscription.farm_keys:
+            self._subscribers[key].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        for key in subscription.farm_keys:
+            subscribers = self._subscribers.get(key)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[key]
+
+    def dispatch(self, payload):
+        """Fan out one `NOTIFY` payload. Must run on the event loop."""
+        event = json.loads(payload)
+        event_type, key = event.pop("type"), event["farm"]
+        subscribers = tuple(self._subscribers.get(key, ()))
+        if not subscribers:
+            return
+        if event_type == "timeseries":
+            for subscription in subscribers:
+                subscription.push_batch(key, event)
+        else:
+            message = encode_event(event_type, event)
+            for subscription in subscribers:
+                subscription.push(message)
+
+    async def stream(self, farm_keys, heartbeat=LIVE_HEARTBEAT_SECONDS):
+        """
+        Async iterator of SSE messages for a `StreamingHttpResponse`.
+        Sends a comment line every `heartbeat` seconds so proxies keep the
+        connection open, and unsubscribes when the client disconnects.
+        """
+        subscription = self.subscribe(farm_keys)
+        LIVE_SUBSCRIBERS.inc()
+        try:
+            yield b": connected\n\n"
+            while True:
+                try:
+                    yield await asyncio.wait_for(subscription.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield b": heartbeat\n\n"
+        finally:
+            LIVE_SUBSCRIBERS.dec()
+            self.unsubscribe(subscription)
+
+
+class NotificationListener:
+    """
+    A dedicated async PostgreSQL connection `LISTEN`ing on `channel` and
+    feeding `hub`. It sits outside the connection pool, costs no thread
+    while idle, and reconnects after `LIVE_RECONNECT_SECONDS` if the
+    connection is lost.
+    """
+
+    def __init__(self, hub, channel=LIVE_CHANNEL, using=DEFAULT_DB_ALIAS):
+        self.hub = hub
+        self.channel = channel
+        self.using = using
+        self.ready = asyncio.Event()
+        self._task = None
+
+    def ensure_running(self):
+        """Start the listener on the running loop unless it already is."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def run(self):
+        while True:
+            try:
+                await self._listen()
+            except (psycopg.Error, OSError) as exc:
+                logger.warning("Live updates listener disconnected: %s", exc)
+            self.ready.clear()
+            await asyncio.sleep(LIVE_RECONNECT_SECONDS)
+
+    def connection_params(self):
+        params = connections[self.using].get_connection_params()
+        # Django's sync cursor class and type adapters don't apply here.
+        params.pop("cursor_factory", None)
+        params.pop("context", None)
+        return params
+
+    async def _listen(self):
+        async with await psycopg.AsyncConnection.connect(
+            autocommit=True, **self.connection_params()
+        ) as connection:
+            await connection.execute(f'LISTEN "{self.channel}"')
+            self.ready.set()
+            async for notification in connection.notifies():
+                self.hub.dispatch(notification.payload)
+
+
+hub = LiveHub()
+listener = NotificationListener(hub)
+
+
+def send_notification(payload, using=DEFAULT_DB_ALIAS):
+    """
+    `NOTIFY` listeners in every worker. Inside a transaction PostgreSQL
+    holds the notification back until commit and drops it on rollback.
+    """
+    data = json.dumps(payload, cls=DjangoJSONEncoder, separators=(",", ":"))
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT pg_notify(%s, %s)", [LIVE_CHANNEL, data])
+
+
+def timeseries_batch_event(model, farm_id, count, nodes, start, end):
+    """
+    Compact summary of a batch of `count` timeseries rows: the farm, node
+    range and time range clients should refetch. It stays well below the
+    8000 byte `NOTIFY` payload limit whatever the batch size.
+    """
+    return {
+        "type": "timeseries",
+        "farm": farm_key(model.farm_type, farm_id),
+        "rows": count,
+        "nodes": [min(nodes), max(nodes)],
+        "start": start,
+        "end": end,
+    }
+
+
+def notify_timeseries_batch(model, farm_id, rows, using=DEFAULT_DB_ALIAS):
+    """
+    Announce `rows`, instances of `model` for one farm, when the current
+    transaction commits. Ingest code calls this once per batch, in the
+    transaction that inserts it; `bulk_create` and `COPY` bypass signals.
+    """
+    if rows:
+        times = [row.time for row in rows]
+        send_notification(
+            timeseries_batch_event(
+                model, farm_id, len(rows), [row.node_id for row in rows], min(times), max(times)
+            ),
+            using,
+        )
+
+
+def notify_alarm(alarm):
+    """Announce an alarm change when the current transaction commits."""
+    farm_type = ALARM_FARM_TYPES.get(ContentType.objects.get_for_id(alarm.content_type_id).model)
+    if farm_type is None:
+        return
+    send_notification({
+        "type": "alarm",
+        "farm": farm_key(farm_type, alarm.farm_id),
+        "alarm_id": alarm.alarm_id,
+        "alarm_code": alarm.alarm_code,
+        "node_id": alarm.node_id,
+        "time_on": alarm.time_on,
+        "time_off": alarm.time_off,
+    })
@@ -1,7 +1,16 @@
+import argparse
+import math
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta, date, datetime, timezone as dt_timezone
+import django
+import numpy as np
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from datetime import timedelta, date
-from random import uniform, randint
+from core.metrics import observe_ingest_batch
 from farms.models import (
     Company, 
     WindFarm, 
@@ -10,9 +19,45 @@ from farms.models import (
     SolarPanelModel
 )
 from timeseries.models import WindFarmTimeseries, SolarFarmTimeseries
+from timeseries.synthetic import load_node, solar_farm_params, wind_farm_params
+
+SPAN_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 7 * 86400, 'y': 365 * 86400}
+re_span = re.compile(r'^(\d+(?:\.\d+)?)([smhdwy])$')
+SOLAR_NODES_DEFAULT = 20
+
+
+def parse_span(value):
+    """`90m`, `12h`, `30d`, `2y`, ... as a number of seconds."""
+    match = re_span.match(value.strip().lower())
+    if not match:
+        raise argparse.ArgumentTypeError(f'Invalid time span {value!r}, expected e.g. 10m, 24h, 30d or 2y')
+    return float(match.group(1)) * SPAN_UNITS[match.group(2)]
 
 class Command(BaseCommand):
-    help = 'Creates test data for all models including TimescaleDB tables'
+    help = (
+        'Creates test data for all models including TimescaleDB tables. '
+        'Timeseries are synthetic but physically plausible, generated with NumPy and '
+        'bulk-loaded with COPY by parallel worker processes (see timeseries.synthetic).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wind-farms', type=int, default=2, help='Number of wind farms')
+        parser.add_argument('--solar-farms', type=int, default=2, help='Number of solar farms')
+        parser.add_argument(
+            '--nodes',
+            type=int,
+            help=f'Nodes per farm (default: the number of turbines of a wind farm, '
+                 f'{SOLAR_NODES_DEFAULT} inverters per solar farm)',
+        )
+        parser.add_argument('--duration', type=parse_span, default='1d', help='Time span to generate, e.g. 24h, 30d, 2y')
+        parser.add_argument('--interval', type=parse_span, default='10m', help='Time between measurements')
+        parser.add_argument('--seed', type=int, help='Random seed, for reproducible data')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Worker processes loading nodes in parallel',
+        )
 
     def create_companies(self):
         companies = [
@@ -190,7 +235,7 @@ class Command(BaseCommand):
         
         return created_panels
 
-    def create_farms(self, companies, turbines, panels):
+    def create_farms(self, companies, turbines, panels, wind_count=2, solar_count=2):
         wind_farms = [
             {
                 'name': 'Coastal Winds',
@@ -264,7 +309,7 @@ class Command(BaseCommand):
         created_wind_farms = []
         created_solar_farms = []
 
-        for farm_data in wind_farms:
+        for farm_data in self.numbered(wind_farms, wind_count):
             farm, created = WindFarm.objects.get_or_create(
                 name=farm_data['name'],
                 defaults=farm_data
@@ -273,7 +318,7 @@ class Command(BaseCommand):
             action = 'Created' if created else 'Retrieved'
             self.stdout.write(f"{action} wind farm: {farm.name}")
 
-        for farm_data in solar_farms:
+        for farm_data in self.numbered(solar_farms, solar_count):
             farm, created = SolarFarm.objects.get_or_create(
                 name=farm_data['name'],
                 defaults=farm_data
@@ -284,58 +329,93 @@ class Command(BaseCommand):
 
         return created_wind_farms, created_solar_farms
 
-    def create_timeseries_data(self, wind_farms, solar_farms):
-        # Create data for the last 24 hours with 10-minute intervals
-        end_time = timezone.now()
-        start_time = end_time - timedelta(hours=24)
-        current_time = start_time
+    def numbered(self, templates, count):
+        """`count` farm definitions, repeating `templates` under numbered names."""
+        for i in range(count):
+            farm_data = dict(templates[i % len(templates)])
+            if i >= len(templates):
+                farm_data['name'] = f"{farm_data['name']} {i // len(templates) + 1}"
+            yield farm_data
+
+    def create_timeseries_data(self, wind_farms, solar_farms, nodes=None, duration=86400,
+                               interval=600, seed=None, workers=1):
+        if seed is None:
+            seed = int(np.random.SeedSequence().entropy % 2**32)
+        periods = max(int(duration // interval), 1)
+        now = timezone.now().timestamp()
+        end_time = datetime.fromtimestamp(math.floor(now / interval) * interval, dt_timezone.utc)
+        start_time = end_time - timedelta(seconds=interval * (periods - 1))
 
-        while current_time <= end_time:
-            for wind_farm in wind_farms:
-                WindFarmTimeseries.objects.create(
-                    time=current_time,
-                    farm=wind_farm,
-                    node_id=randint(1, wind_farm.number_of_turbines),
-                    active_power_min=round(uniform(100, 500), 2),
-                    active_power_max=round(uniform(1500, 2500), 2),
-                    active_power_mean=round(uniform(800, 2000), 2),
-                    energy_accumulated=round(uniform(5000, 20000), 2),
-                    energy_accumulated_export=round(uniform(1000, 5000), 2),
-                    energy_accumulated_import=round(uniform(500, 2000), 2),
-                    wind_speed_mean=round(uniform(5.0, 12.0), 2),
-                    wind_speed_stddev=round(uniform(0.5, 3.0), 2),
-                    wind_direction_mean=round(uniform(0, 360), 2),
-                    wind_direction_stddev=round(uniform(5.0, 20.0), 2),
-                    power_reduction_time=round(uniform(0, 600), 2),
-                    measurement_wind_speed_mean=round(uniform(5.0, 12.0), 2),
-                    measurement_wind_direction_mean=round(uniform(0, 360), 2)
-                )
+        # Replace what an earlier run generated for the same time range.
+        for model, farms in ((WindFarmTimeseries, wind_farms), (SolarFarmTimeseries, solar_farms)):
+            model.objects.filter(
+                farm_id__in=[farm.id for farm in farms], time__gte=start_time, time__lte=end_time
+            ).delete()
 
-            for solar_farm in solar_farms:
-                SolarFarmTimeseries.objects.create(
-                    time=current_time,
-                    farm=solar_farm,
-                    node_id=randint(1, solar_farm.number_of_panels),
-                    solar_irradiance=round(uniform(200, 1000), 2),
-                    power_output=round(uniform(50, 500), 2),
-                    module_temperature=round(uniform(20, 40), 2)
-                )
+        farm_nodes = [
+            (wind_farm_params(farm), nodes or farm.number_of_turbines) for farm in wind_farms
+        ] + [
+            (solar_farm_params(farm, nodes or SOLAR_NODES_DEFAULT), nodes or SOLAR_NODES_DEFAULT)
+            for farm in solar_farms
+        ]
+        tasks = [
+            {'farm': farm_params, 'node_id': node_id, 'seed': seed,
+             'start': start_time, 'periods': periods, 'interval': interval}
+            for farm_params, count in farm_nodes
+            for node_id in range(1, count + 1)
+        ]
 
-            current_time += timedelta(minutes=10)
+        self.stdout.write(
+            f'Loading {len(tasks)} nodes x {periods} measurements from {start_time} to {end_time} '
+            f'with {workers} workers (seed {seed})'
+        )
+        started = time.perf_counter()
+        total = 0
+        for done, (farm_type, rows, seconds) in enumerate(self.run_tasks(tasks, workers), 1):
+            observe_ingest_batch('create_test_data', farm_type, rows, duration=seconds)
+            total += rows
+            if done % 50 == 0 or done == len(tasks):
+                self.stdout.write(f'  {done}/{len(tasks)} nodes, {total} rows')
+        elapsed = time.perf_counter() - started
 
         self.stdout.write(
             self.style.SUCCESS(
-                f'Created time series data from {start_time} to {end_time}'
+                f'Created {total} time series rows from {start_time} to {end_time} '
+                f'in {elapsed:.1f}s ({total / max(elapsed, 1e-9):.0f} rows/s)'
             )
         )
 
-    def handle(self, *args, **kwargs):
+    def run_tasks(self, tasks, workers):
+        if workers <= 1 or len(tasks) <= 1:
+            yield from map(load_node, tasks)
+            return
+        # Spawned workers set Django up themselves rather than inheriting
+        # this process's database connections.
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup,
+        ) as executor:
+            for future in as_completed([executor.submit(load_node, task) for task in tasks]):
+                yield future.result()
+
+    def handle(self, *args, **options):
         self.stdout.write('Creating test data...')
         
         companies = self.create_companies()
         turbines = self.create_turbine_models()
         panels = self.create_panel_models()
-        wind_farms, solar_farms = self.create_farms(companies, turbines, panels)
-        self.create_timeseries_data(wind_farms, solar_farms)
+        wind_farms, solar_farms = self.create_farms(
+            companies, turbines, panels, options['wind_farms'], options['solar_farms']
+        )
+        self.create_timeseries_data(
+            wind_farms,
+            solar_farms,
+            nodes=options['nodes'],
+            duration=options['duration'],
+            interval=options['interval'],
+            seed=options['seed'],
+            workers=options['workers'],
+        )
         
-        self.stdout.write(self.style.SUCCESS('Successfully created all test data')) 
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS('Successfully created all test data'))
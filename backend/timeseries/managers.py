@@ -1,20 +1,157 @@
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.contenttypes.prefetch import GenericPrefetch
 from django.db import models
-from django.utils import timezone
-from datetime import timedelta
-
-# class TimeSeriesManager(models.Manager):
-    # def get_last_24_hours(self, station_id):
-    #     end_time = timezone.now()
-    #     start_time = end_time - timedelta(hours=24)
-    #     return self.filter(
-    #         station_id=station_id,
-    #         time__range=(start_time, end_time)
-    #     ).time_bucket('time', '1 hour')
-
-    # def get_daily_average(self, station_id, days=7):
-    #     end_time = timezone.now()
-    #     start_time = end_time - timedelta(days=days)
-    #     return self.filter(
-    #         station_id=station_id,
-    #         time__range=(start_time, end_time)
-    #     ).time_bucket('time', '1 day') 
\ No newline at end of file
+from django.db.models import Avg, FloatField, Func, IntegerField, Q, Value
+from django.db.models.functions import Cast
+from timescale.db.models.expressions import TimeBucket, TimeBucketGapFill
+from timescale.db.models.querysets import TimescaleQuerySet
+from farms.models import SolarFarm, WindFarm
+
+# TimescaleDB gapfill functions applied to bucket averages.
+FILL_METHODS = ["locf", "interpolate"]
+
+
+def bucket_expression(interval, gapfill_window=None):
+    """
+    `time_bucket` over the `time` column, or `time_bucket_gapfill` when a
+    `(start, end)` window is given so empty buckets are returned too.
+    """
+    if gapfill_window:
+        return TimeBucketGapFill("time", interval, *gapfill_window)
+    return TimeBucket("time", interval)
+
+
+def bucket_average(field, fill=None):
+    """
+    Average of `field` as double precision, optionally passed through
+    TimescaleDB's `locf` or `interpolate` to fill gapfilled buckets.
+    """
+    average = Cast(Avg(field), FloatField())
+    if fill is None:
+        return average
+    if fill not in FILL_METHODS:
+        raise ValueError(f"Unknown fill method: {fill}")
+    return Func(average, function=fill, output_field=FloatField())
+
+
+class TimeSeriesQuerySet(TimescaleQuerySet):
+    """
+    Query helpers shared by the wind and solar hypertables.
+    """
+
+    def for_farm(self, farm_id, node_ids=None):
+        qs = self.filter(farm_id=farm_id)
+        if node_ids:
+            qs = qs.filter(node_id__in=node_ids)
+        return qs
+
+    def in_range(self, start, end):
+        return self.filter(time__gte=start, time__lt=end)
+
+    def bucketed(self, interval, fields, gapfill_window=None, fill=None):
+        """
+        Average each field over `interval` wide buckets, oldest bucket first.
+
+        Returns `(bucket, value, ...)` tuples. Averages are cast to double
+        precision in SQL so rows come back as floats instead of Decimals.
+
+        With `gapfill_window=(start, end)` every bucket of the window is
+        returned; buckets without data are NULL unless `fill` maps the field
+        to one of `FILL_METHODS`.
+        """
+        fill = fill or {}
+        aggregates = {
+            f"{field}__avg": bucket_average(field, fill.get(field))
+            for field in fields
+        }
+        return (
+            self.values(bucket=bucket_expression(interval, gapfill_window))
+            .annotate(**aggregates)
+            .order_by("bucket")
+            .values_list("bucket", *aggregates)
+        )
+
+    def bucketed_field(self, interval, field, label, gapfill_window=None, fill=None):
+        """
+        Single-field variant of `bucketed` returning `(label, bucket, value)`
+        tuples. Querysets for different farms, node sets and even models can
+        be combined with `union()` and fetched in one round-trip.
+        """
+        return (
+            self.values(bucket=bucket_expression(interval, gapfill_window))
+            .annotate(
+                label=Value(label, output_field=IntegerField()),
+                value=bucket_average(field, fill),
+            )
+            .values_list("label", "bucket", "value")
+        )
+
+    def raw_rows(self, fields):
+        """
+        Unaggregated `(time, node_id, value, ...)` tuples in time order,
+        with values cast to double precision.
+        """
+        return self.order_by("time", "node_id").values_list(
+            "time", "node_id", *[Cast(field, FloatField()) for field in fields]
+        )
+
+
+class TimeSeriesManager(models.Manager.from_queryset(TimeSeriesQuerySet)):
+    """
+    Drop-in replacement for `TimescaleManager` that also exposes the
+    `TimeSeriesQuerySet` helpers.
+    """
+
+
+ALARM_FARM_MODELS = {"wind": WindFarm, "solar": SolarFarm}
+
+
+class AlarmQuerySet(models.QuerySet):
+    def for_farms(self, farms):
+        """Alarms of any of the `(farm_type, farm_id)` pairs in `farms`."""
+        condition = Q()
+        for farm_type, farm_id in farms:
+            content_type = ContentType.objects.get_for_model(ALARM_FARM_MODELS[farm_type])
+            condition |= Q(content_type=content_type, farm_id=farm_id)
+        return self.filter(condition)
+
+    def for_company(self, company_id):
+        """Alarms of the farms of company `company_id`, of any farm type."""
+        condition = Q()
+        for model in ALARM_FARM_MODELS.values():
+            content_type = ContentType.objects.get_for_model(model)
+            farm_ids = model.objects.filter(company_id=company_id).values("pk")
+            condition |= Q(content_type=content_type, farm_id__in=farm_ids)
+        return self.filter(condition)
+
+    def active(self):
+        """Alarms that have not cleared yet, served by a partial index."""
+        return self.filter(time_off__isnull=True)
+
+    def newest_first(self, before=None):
+        """
+        Alarms ordered by `(time_on, id)`, newest first. With `before`, a
+        `(time_on, id)` pair from the last row of the previous page, only
+        older alarms are returned: the page continues through the index
+        from there instead of skipping rows with OFFSET.
+        """
+        qs = self.order_by("-time_on", "-id")
+        if before is not None:
+            time_on, pk = before
+            qs = qs.filter(time_on__lte=time_on).filter(Q(time_on__lt=time_on) | Q(pk__lt=pk))
+        return qs
+
+    def with_farms(self, fields=("name",)):
+        """
+        Load the `farm` of every alarm in one query per farm model rather
+        than one per alarm. Only `fields` of the farms are fetched.
+        """
+        return self.select_related("content_type").prefetch_related(
+            GenericPrefetch(
+                "farm",
+                [
+                    model.objects.using(self._db).only("id", *fields)
+                    for model in ALARM_FARM_MODELS.values()
+                ],
+            )
+        )
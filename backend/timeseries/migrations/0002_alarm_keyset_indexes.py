@@ -0,0 +1,32 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Index alarms by `(time_on, id)` for keyset pagination of the alarm
+    list, plus a partial index of the open alarms (`time_off IS NULL`) so
+    listing them doesn't depend on the size of the history. Built
+    concurrently to avoid blocking alarm ingest.
+    """
+
+    atomic = False
+
+    dependencies = [
+        ("timeseries", "0001_initial"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="alarm",
+            index=models.Index(fields=["time_on", "id"], name="alarm_time_on_id_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="alarm",
+            index=models.Index(
+                condition=models.Q(("time_off__isnull", True)),
+                fields=["time_on", "id"],
+                name="alarm_open_time_on_id_idx",
+            ),
+        ),
+    ]
@@ -5,6 +5,7 @@ from timescale.db.models.models import TimescaleModel
 from timescale.db.models.fields import TimescaleDateTimeField
 from timescale.db.models.managers import TimescaleManager
 from farms.models import WindFarm, SolarFarm
+from .managers import AlarmQuerySet, TimeSeriesManager
 
 
 class BaseTimeSeriesData(models.Model):
@@ -15,7 +16,7 @@ class BaseTimeSeriesData(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     objects = models.Manager()
-    timescale = TimescaleManager()
+    timescale = TimeSeriesManager()
 
     class Meta:
         abstract = True
@@ -29,8 +30,19 @@ class BaseTimeSeriesData(models.Model):
             )
         ]
 
+    @classmethod
+    def measurement_fields(cls):
+        """Names of the numeric measurement columns that can be queried."""
+        return [
+            field.name
+            for field in cls._meta.concrete_fields
+            if isinstance(field, models.DecimalField)
+        ]
+
 
 class WindFarmTimeseries(BaseTimeSeriesData):
+    farm_type = "wind"
+
     farm = models.ForeignKey(
         WindFarm, on_delete=models.CASCADE, related_name="timeseries_data"
     )
@@ -141,6 +153,8 @@ class WindFarmTimeseries(BaseTimeSeriesData):
 
 
 class SolarFarmTimeseries(BaseTimeSeriesData):
+    farm_type = "solar"
+
     farm = models.ForeignKey(
         SolarFarm, on_delete=models.CASCADE, related_name="timeseries_data"
     )
@@ -188,13 +202,21 @@ class Alarm(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-    objects = models.Manager()
+    objects = AlarmQuerySet.as_manager()
     timescale = TimescaleManager()
 
     class Meta:
         indexes = [
             models.Index(fields=["time_on", "node_id"]),
             models.Index(fields=["content_type", "farm_id"]),
+            # Keyset pagination of the alarm list, see `AlarmQuerySet.newest_first`
+            models.Index(fields=["time_on", "id"], name="alarm_time_on_id_idx"),
+            # Open alarms are a tiny fraction of the history
+            models.Index(
+                fields=["time_on", "id"],
+                condition=models.Q(time_off__isnull=True),
+                name="alarm_open_time_on_id_idx",
+            ),
         ]
         constraints = [
             models.UniqueConstraint(
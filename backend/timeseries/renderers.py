@@ -0,0 +1,109 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from .series import is_series, iter_rows
+
+try:
+    import pyarrow
+except ImportError:  # Arrow output is optional, see pyproject extras
+    pyarrow = None
+
+
+class TimeseriesJSONRenderer(JSONRenderer):
+    """
+    Default `application/json` output: one `{time, field: value}` object
+    per bucket.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if is_series(data):
+            data = list(iter_rows(data))
+        return super().render(data, accepted_media_type, renderer_context)
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """
+    One array per field, e.g. `{"time": [...], "active_power_mean": [...]}`.
+    Times are epoch milliseconds so they can be passed straight to `new Date()`.
+
+    Selected with `Accept: application/vnd.firmaboard.columnar+json` or
+    `?format=columnar`.
+    """
+
+    media_type = "application/vnd.firmaboard.columnar+json"
+    format = "columnar"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if is_series(data):
+            data = {
+                **data,
+                "time": [int(value.timestamp() * 1000) for value in data["time"]],
+            }
+        return super().render(data, accepted_media_type, renderer_context)
+
+
+def render_error_as_json(data, renderer_context):
+    """
+    Binary renderers only know how to encode series, so anything else
+    (validation errors, 404s) is sent back as JSON.
+    """
+    response = (renderer_context or {}).get("response")
+    if response is not None:
+        response["Content-Type"] = "application/json"
+    return JSONRenderer().render(data)
+
+
+class ArrowRenderer(BaseRenderer):
+    """
+    Apache Arrow IPC stream with a UTC millisecond `time` column and one
+    float64 column per field.
+
+    Selected with `Accept: application/vnd.apache.arrow.stream` or
+    `?format=arrow`. Error responses fall back to JSON.
+    """
+
+    media_type = "application/vnd.apache.arrow.stream"
+    format = "arrow"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not is_series(data):
+            return render_error_as_json(data, renderer_context)
+
+        columns = {"time": pyarrow.array(data["time"], pyarrow.timestamp("ms", tz="UTC"))}
+        for field, values in data.items():
+            if field != "time":
+                columns[field] = pyarrow.array(values, pyarrow.float64())
+        table = pyarrow.table(columns)
+
+        sink = pyarrow.BufferOutputStream()
+        with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+
+class CSVRenderer(BaseRenderer):
+    """
+    Negotiates `text/csv` for the export endpoint, which streams its own
+    body. Only error responses go through `render`.
+    """
+
+    media_type = "text/csv"
+    format = "csv"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return render_error_as_json(data, renderer_context)
+
+
+class ParquetRenderer(CSVRenderer):
+    media_type = "application/vnd.apache.parquet"
+    format = "parquet"
+    charset = None
+
+
+TIMESERIES_RENDERERS = [TimeseriesJSONRenderer, ColumnarJSONRenderer]
+if pyarrow is not None:
+    TIMESERIES_RENDERERS.append(ArrowRenderer)
+
+EXPORT_RENDERERS = [CSVRenderer]
+if pyarrow is not None:
+    EXPORT_RENDERERS.append(ParquetRenderer)
@@ -0,0 +1,235 @@
+from datetime import timedelta, timezone as dt_timezone
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import serializers
+from .downsampling import DOWNSAMPLING_METHODS, minimum_points
+from .live import ALARM_FARM_TYPES
+from .managers import ALARM_FARM_MODELS, FILL_METHODS
+from .models import Alarm
+
+BUCKET_INTERVALS = [
+    "10 minutes",
+    "30 minutes",
+    "1 hour",
+    "6 hours",
+    "1 day",
+    "1 week",
+]
+
+
+class CommaSeparatedListField(serializers.ListField):
+    """
+    List field that also accepts a single comma-separated query param,
+    e.g. `?nodes=1,2,3`.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            data = [item for item in data.split(",") if item.strip()]
+        elif isinstance(data, list) and len(data) == 1 and isinstance(data[0], str):
+            data = [item for item in data[0].split(",") if item.strip()]
+        return super().to_internal_value(data)
+
+
+class TimeWindowSerializer(serializers.Serializer):
+    """
+    Validates the `start`/`end` window shared by the timeseries endpoints,
+    defaulting to the last 24 hours.
+    """
+
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        attrs.setdefault("end", timezone.now())
+        attrs.setdefault("start", attrs["end"] - timedelta(hours=24))
+        if attrs["start"] >= attrs["end"]:
+            raise serializers.ValidationError("start must be before end")
+        return attrs
+
+
+class BucketingSerializer(TimeWindowSerializer):
+    interval = serializers.ChoiceField(choices=BUCKET_INTERVALS, default="1 hour")
+    max_points = serializers.IntegerField(min_value=10, max_value=100_000, required=False)
+    downsample = serializers.ChoiceField(choices=DOWNSAMPLING_METHODS, default="lttb")
+    gapfill = serializers.BooleanField(default=False)
+
+
+class TimeseriesRangeSerializer(TimeWindowSerializer):
+    """
+    Validates the query params of the single-farm timeseries endpoints.
+    The model being queried is passed in the serializer context.
+    """
+
+    fields = CommaSeparatedListField(
+        child=serializers.CharField(), required=False, allow_empty=False
+    )
+    nodes = CommaSeparatedListField(
+        child=serializers.IntegerField(min_value=0), required=False
+    )
+
+    def validate_fields(self, value):
+        available = self.context["model"].measurement_fields()
+        unknown = [field for field in value if field not in available]
+        if unknown:
+            raise serializers.ValidationError(
+                f"Unknown fields: {', '.join(unknown)}"
+            )
+        return list(dict.fromkeys(value))
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        attrs.setdefault("fields", self.context["model"].measurement_fields())
+        return attrs
+
+
+class TimeseriesQuerySerializer(TimeseriesRangeSerializer, BucketingSerializer):
+    fill = CommaSeparatedListField(child=serializers.CharField(), required=False)
+
+    def validate_fill(self, value):
+        """
+        Parse `field:method` pairs, e.g. `?fill=active_power_mean:interpolate`.
+        """
+        available = self.context["model"].measurement_fields()
+        fill = {}
+        for item in value:
+            field, _, method = item.partition(":")
+            if field not in available:
+                raise serializers.ValidationError(f"Unknown field: {field}")
+            if method not in FILL_METHODS:
+                raise serializers.ValidationError(
+                    f"Fill method for {field} must be one of: {', '.join(FILL_METHODS)}"
+                )
+            fill[field] = method
+        return fill
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        if attrs.get("fill"):
+            attrs["gapfill"] = True
+        minimum = minimum_points(len(attrs["fields"]))
+        if attrs.get("max_points", minimum) < minimum:
+            raise serializers.ValidationError({
+                "max_points": f"Must be at least {minimum} for {len(attrs['fields'])} fields."
+            })
+        return attrs
+
+
+class BatchSelectorSerializer(serializers.Serializer):
+    id = serializers.CharField(max_length=100, required=False)
+    farm_type = serializers.ChoiceField(choices=["wind", "solar"])
+    farm_id = serializers.IntegerField(min_value=1)
+    nodes = serializers.ListField(
+        child=serializers.IntegerField(min_value=0), required=False
+    )
+    field = serializers.CharField()
+    fill = serializers.ChoiceField(choices=FILL_METHODS, required=False)
+
+    def validate(self, attrs):
+        model = self.context["models"][attrs["farm_type"]]
+        if attrs["field"] not in model.measurement_fields():
+            raise serializers.ValidationError(
+                {"field": f"Unknown {attrs['farm_type']} field: {attrs['field']}"}
+            )
+        return attrs
+
+
+class BatchQuerySerializer(BucketingSerializer):
+    """
+    Body of the batch endpoint. The timeseries model for each farm type is
+    passed in the serializer context as `models`.
+    """
+
+    selectors = BatchSelectorSerializer(many=True, allow_empty=False, max_length=100)
+
+    def validate_selectors(self, value):
+        for position, selector in enumerate(value):
+            selector.setdefault("id", str(position))
+        ids = [selector["id"] for selector in value]
+        if len(set(ids)) != len(ids):
+            raise serializers.ValidationError("Selector ids must be unique")
+        return value
+
+
+def encode_cursor(time, pk):
+    """Keyset position `<time>_<id>` of a row, in UTC so it needs no `+`."""
+    return f"{time.astimezone(dt_timezone.utc):%Y-%m-%dT%H:%M:%S.%f}Z_{pk}"
+
+
+class KeysetCursorField(serializers.CharField):
+    """Parses an `encode_cursor` position back into a `(time, id)` pair."""
+
+    default_error_messages = {"invalid": "Invalid cursor."}
+
+    def to_internal_value(self, data):
+        time, _, pk = super().to_internal_value(data).rpartition("_")
+        time = parse_datetime(time)
+        if time is None or time.tzinfo is None or not pk.isdigit():
+            self.fail("invalid")
+        return time, int(pk)
+
+
+class AlarmQuerySerializer(serializers.Serializer):
+    """
+    Query params of the alarm list. `cursor` is the `next` value of the
+    previous page.
+    """
+
+    farms = CommaSeparatedListField(child=serializers.CharField(), required=False)
+    nodes = CommaSeparatedListField(
+        child=serializers.IntegerField(min_value=0), required=False
+    )
+    codes = CommaSeparatedListField(
+        child=serializers.CharField(max_length=50), required=False
+    )
+    active = serializers.BooleanField(default=False)
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=1000, default=100)
+    cursor = KeysetCursorField(required=False)
+
+    def validate_farms(self, value):
+        """Parse `farm_type:farm_id` pairs, e.g. `?farms=wind:1,solar:3`."""
+        farms = []
+        for item in value:
+            farm_type, _, farm_id = item.strip().partition(":")
+            if farm_type not in ALARM_FARM_MODELS or not farm_id.isdigit():
+                raise serializers.ValidationError(f"Invalid farm: {item}")
+            farms.append((farm_type, int(farm_id)))
+        return farms
+
+    def validate(self, attrs):
+        if "start" in attrs and "end" in attrs and attrs["start"] >= attrs["end"]:
+            raise serializers.ValidationError("start must be before end")
+        return attrs
+
+
+class AlarmSerializer(serializers.ModelSerializer):
+    """
+    An alarm with its farm. Serialize querysets from `with_farms()`, or
+    every alarm costs a query for its farm.
+    """
+
+    farm_type = serializers.SerializerMethodField()
+    farm_name = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Alarm
+        fields = [
+            "id",
+            "alarm_id",
+            "alarm_code",
+            "farm_type",
+            "farm_id",
+            "farm_name",
+            "node_id",
+            "time_on",
+            "time_off",
+        ]
+
+    def get_farm_type(self, obj):
+        return ALARM_FARM_TYPES.get(obj.content_type.model)
+
+    def get_farm_name(self, obj):
+        # The farm may have been deleted; alarms don't cascade with it.
+        return obj.farm.name if obj.farm is not None else None
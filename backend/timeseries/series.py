@@ -0,0 +1,33 @@
+"""
+Column-oriented containers for timeseries query results.
+
+A series is a dict of equally long lists: `time` holds the bucket
+timestamps and every other key holds the values of one field. The
+renderers in `timeseries.renderers` turn it into rows, columnar JSON or
+Arrow depending on what the client asked for.
+"""
+
+
+def to_columns(rows, fields):
+    """
+    Transpose `(time, value, ...)` tuples into a series dict.
+    """
+    rows = list(rows)
+    columns = list(zip(*rows)) if rows else [()] * (len(fields) + 1)
+    series = {"time": list(columns[0])}
+    for field, values in zip(fields, columns[1:]):
+        series[field] = list(values)
+    return series
+
+
+def is_series(data):
+    return isinstance(data, dict) and isinstance(data.get("time"), list)
+
+
+def iter_rows(series):
+    """
+    Yield one `{time, field: value}` dict per timestamp.
+    """
+    fields = list(series)
+    for values in zip(*series.values()):
+        yield dict(zip(fields, values))
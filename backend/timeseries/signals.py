@@ -0,0 +1,9 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from .live import notify_alarm
+from .models import Alarm
+
+
+@receiver(post_save, sender=Alarm)
+def publish_alarm(sender, instance, **kwargs):
+    notify_alarm(instance)
@@ -0,0 +1,235 @@
+"""
+Synthetic wind and solar timeseries for load testing (`create_test_data`).
+
+Series are generated per node with NumPy and streamed into the hypertables
+with `COPY`, one node per task, so loading parallelises across processes.
+Every farm-wide component is derived from `(seed, farm)` and every node
+component from `(seed, farm, node)`, which makes a run reproducible
+whichever worker happens to load which node.
+
+Wind: the two horizontal wind components are correlated Gaussian (AR(1))
+processes shared by the farm plus a smaller per-turbine part. The speed
+`hypot(u, v)` is then Weibull distributed with shape 2 (Rayleigh) around
+the farm's average wind speed, and the direction follows the same flow.
+Power comes from the turbine model's power curve.
+
+Solar: clear-sky irradiance from the sun's elevation at the farm
+(Haurwitz model), dimmed by a slowly varying cloud cover; module
+temperature from a seasonal and daily ambient cycle plus irradiance
+heating (NOCT model); power from the panel's temperature coefficient.
+"""
+
+import math
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+import numpy as np
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from .live import send_notification, timeseries_batch_event
+
+WIND, SOLAR = "wind", "solar"
+FARM_TYPE_SEEDS = {WIND: 1, SOLAR: 2}
+
+WIND_CORRELATION_HOURS = 6
+TURBINE_CORRELATION_HOURS = 0.5
+# Share of a turbine's wind variance that is its own rather than the farm's.
+TURBINE_VARIANCE_SHARE = 0.1
+TURBULENCE_INTENSITY = 0.12
+# Power drawn from the grid by an idle turbine, as a share of rated power.
+IDLE_CONSUMPTION = 0.002
+
+CLOUD_CORRELATION_HOURS = 24
+PERFORMANCE_RATIO = 0.85
+MEAN_AMBIENT_TEMPERATURE = 15.0
+SEASONAL_TEMPERATURE_SWING = 10.0
+DAILY_TEMPERATURE_SWING = 5.0
+
+
+def ar1(rng, periods, phi, scale=1.0):
+    """A stationary AR(1) series with standard deviation `scale`."""
+    noise = rng.standard_normal(periods) * (scale * math.sqrt(1 - phi * phi))
+    series = np.empty(periods)
+    value = rng.standard_normal() * scale
+    for i in range(periods):
+        value = phi * value + noise[i]
+        series[i] = value
+    return series
+
+
+def correlation(interval, hours):
+    return math.exp(-interval / (hours * 3600))
+
+
+def farm_rng(seed, farm, *extra):
+    return np.random.default_rng([seed, FARM_TYPE_SEEDS[farm["type"]], farm["id"], *extra])
+
+
+def wind_farm_params(farm):
+    """Plain-data parameters of a `WindFarm`, for worker processes."""
+    turbine = farm.turbine_model
+    rated = float(turbine.power_output)
+    cut_in, cut_out = float(turbine.cut_in_speed), float(turbine.cut_out_speed)
+    curve = turbine.power_curve or {}
+    speeds, power = curve.get("wind_speeds"), curve.get("power_output")
+    if not speeds or len(speeds) != len(power or ()):
+        # No usable curve: cubic between cut-in and rated speed.
+        rated_speed = float(turbine.rated_wind_speed or cut_in + 9)
+        speeds = np.linspace(cut_in, rated_speed, 20)
+        power = rated * ((speeds - cut_in) / (rated_speed - cut_in)) ** 3
+    return {
+        "type": WIND,
+        "id": farm.id,
+        "mean_speed": float(farm.average_wind_speed or 8.0),
+        "rated_power": rated,
+        "cut_in": cut_in,
+        "cut_out": cut_out,
+        "curve_speeds": [float(s) for s in speeds],
+        "curve_power": [float(p) for p in power],
+    }
+
+
+def solar_farm_params(farm, nodes):
+    """Plain-data parameters of a `SolarFarm` split over `nodes` inverters."""
+    panel = farm.panel_model
+    return {
+        "type": SOLAR,
+        "id": farm.id,
+        "latitude": float(farm.latitude),
+        "longitude": float(farm.longitude),
+        "node_capacity": float(farm.nominal_power) * 1000 / nodes,
+        "temp_coefficient": float(panel.temp_coefficient_pmax or -0.35) / 100,
+        "noct": float(panel.nominal_operating_temp or 45),
+    }
+
+
+def turbine_power(farm, speed):
+    power = np.interp(speed, farm["curve_speeds"], farm["curve_power"], left=0.0)
+    power[(speed < farm["cut_in"]) | (speed >= farm["cut_out"])] = 0.0
+    return power
+
+
+def wind_node_series(farm, node_id, seed, start, periods, interval):
+    """Column arrays of `WindFarmTimeseries` for one turbine."""
+    # Zero-mean Gaussian components with this sigma give Rayleigh (Weibull
+    # k=2) speeds with the requested mean.
+    sigma = farm["mean_speed"] / math.sqrt(math.pi / 2)
+    farm_random = farm_rng(seed, farm)
+    phi = correlation(interval, WIND_CORRELATION_HOURS)
+    farm_u = ar1(farm_random, periods, phi, sigma)
+    farm_v = ar1(farm_random, periods, phi, sigma)
+
+    node_random = farm_rng(seed, farm, node_id)
+    phi = correlation(interval, TURBINE_CORRELATION_HOURS)
+    keep, own = math.sqrt(1 - TURBINE_VARIANCE_SHARE), math.sqrt(TURBINE_VARIANCE_SHARE)
+    u = keep * farm_u + own * ar1(node_random, periods, phi, sigma)
+    v = keep * farm_v + own * ar1(node_random, periods, phi, sigma)
+
+    speed = np.hypot(u, v)
+    speed_stddev = TURBULENCE_INTENSITY * speed
+    power = turbine_power(farm, speed)
+    hours = interval / 3600
+    energy = np.cumsum(power * hours)
+    idle = IDLE_CONSUMPTION * farm["rated_power"] * (power == 0)
+    mast_speed = np.hypot(farm_u, farm_v)
+    return {
+        "active_power_min": turbine_power(farm, np.maximum(speed - 2 * speed_stddev, 0)),
+        "active_power_max": turbine_power(farm, speed + 2 * speed_stddev),
+        "active_power_mean": power,
+        "energy_accumulated": energy,
+        "energy_accumulated_export": energy,
+        "energy_accumulated_import": np.cumsum(idle * hours),
+        "wind_speed_mean": speed,
+        "wind_speed_stddev": speed_stddev,
+        "wind_direction_mean": np.degrees(np.arctan2(u, v)) % 360,
+        "wind_direction_stddev": 5 + 20 / (1 + speed),
+        "power_reduction_time": np.where(speed >= farm["cut_out"], float(interval), 0.0),
+        "measurement_wind_speed_mean": mast_speed,
+        "measurement_wind_direction_mean": np.degrees(np.arctan2(farm_u, farm_v)) % 360,
+    }
+
+
+def solar_node_series(farm, node_id, seed, start, periods, interval):
+    """Column arrays of `SolarFarmTimeseries` for one inverter."""
+    seconds = start.timestamp() + interval * np.arange(periods)
+    day_of_year = (seconds / 86400) % 365.25
+    solar_hours = (seconds / 3600 + farm["longitude"] / 15) % 24
+    declination = np.radians(23.44) * np.sin(2 * np.pi * (284 + day_of_year) / 365)
+    hour_angle = np.radians(15 * (solar_hours - 12))
+    latitude = math.radians(farm["latitude"])
+    elevation_sine = (
+        math.sin(latitude) * np.sin(declination)
+        + math.cos(latitude) * np.cos(declination) * np.cos(hour_angle)
+    )
+    daylight = elevation_sine > 0.01
+    clear_sky = np.zeros(periods)
+    clear_sky[daylight] = 1098 * elevation_sine[daylight] * np.exp(-0.057 / elevation_sine[daylight])
+
+    phi = correlation(interval, CLOUD_CORRELATION_HOURS)
+    clearness = np.clip(0.75 + 0.25 * ar1(farm_rng(seed, farm), periods, phi), 0.15, 1.0)
+    node_random = farm_rng(seed, farm, node_id)
+    irradiance = clear_sky * clearness * (1 + 0.02 * node_random.standard_normal(periods))
+    irradiance = np.maximum(irradiance, 0)
+
+    hemisphere = 1 if farm["latitude"] >= 0 else -1
+    ambient = (
+        MEAN_AMBIENT_TEMPERATURE
+        - hemisphere * SEASONAL_TEMPERATURE_SWING * np.cos(2 * np.pi * (day_of_year + 10) / 365.25)
+        + DAILY_TEMPERATURE_SWING * np.cos(2 * np.pi * (solar_hours - 15) / 24)
+    )
+    module_temperature = ambient + (farm["noct"] - 20) / 800 * irradiance
+    power = (
+        farm["node_capacity"] * irradiance / 1000 * PERFORMANCE_RATIO
+        * (1 + farm["temp_coefficient"] * (module_temperature - 25))
+    )
+    return {
+        "solar_irradiance": irradiance,
+        "power_output": np.maximum(power, 0),
+        "module_temperature": module_temperature,
+    }
+
+
+NODE_SERIES = {WIND: wind_node_series, SOLAR: solar_node_series}
+
+
+def copy_node_series(model, farm_id, node_id, start, interval, columns, using=DEFAULT_DB_ALIAS):
+    """
+    Stream one node's column arrays into `model`'s table with `COPY`, and
+    announce the batch to live dashboards when it commits.
+    """
+    periods = len(next(iter(columns.values())))
+    step = timedelta(seconds=interval)
+    times = [start + i * step for i in range(periods)]
+    now = datetime.now(dt_timezone.utc)
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    names = ["time", "farm_id", "node_id", "created_at", "updated_at", *columns]
+    sql = "COPY {} ({}) FROM STDIN".format(
+        quote(model._meta.db_table), ", ".join(quote(name) for name in names)
+    )
+    values = [np.round(array, 2).tolist() for array in columns.values()]
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        with cursor.copy(sql) as copy:
+            for row_time, *row in zip(times, *values):
+                copy.write_row((row_time, farm_id, node_id, now, now, *row))
+        if periods:
+            send_notification(
+                timeseries_batch_event(model, farm_id, periods, [node_id], times[0], times[-1]),
+                using,
+            )
+    return periods
+
+
+def load_node(task):
+    """
+    Generate and load one node's series. Runs in worker processes, so it
+    takes and returns plain data only: `(farm_type, rows, seconds)`.
+    """
+    from .models import SolarFarmTimeseries, WindFarmTimeseries
+
+    farm, node_id = task["farm"], task["node_id"]
+    started = time.perf_counter()
+    columns = NODE_SERIES[farm["type"]](
+        farm, node_id, task["seed"], task["start"], task["periods"], task["interval"]
+    )
+    model = WindFarmTimeseries if farm["type"] == WIND else SolarFarmTimeseries
+    rows = copy_node_series(model, farm["id"], node_id, task["start"], task["interval"], columns)
+    return farm["type"], rows, time.perf_counter() - started
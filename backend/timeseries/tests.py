@@ -1,3 +1,693 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+from functools import partial
+from unittest import mock
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from django.http import QueryDict
+from asgiref.sync import sync_to_async
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+from core.models import CustomUser
+from core.tokens import CompanyRefreshToken
+from farms.models import SolarFarm, WindFarm
+from .admin import AlarmAdmin, TimeRangeFilter
+from .downsampling import DOWNSAMPLING_METHODS, downsample, lttb_indices, m4_indices, minimum_points
+from .models import Alarm, SolarFarmTimeseries, WindFarmTimeseries
+from .export import iter_batches, stream_csv, stream_parquet
+from .management.commands.create_test_data import Command as CreateTestDataCommand
+from .live import LiveHub, NotificationListener, encode_event, notify_timeseries_batch
+from .renderers import ArrowRenderer, ColumnarJSONRenderer, TimeseriesJSONRenderer, pyarrow
+from .serializers import (
+    AlarmQuerySerializer, AlarmSerializer, BatchQuerySerializer, TimeseriesQuerySerializer, encode_cursor,
+)
+from .series import to_columns
+from .synthetic import copy_node_series, solar_node_series, wind_node_series
 
-# Create your tests here.
+
+class TimeseriesRendererTest(SimpleTestCase):
+    def setUp(self):
+        rows = [
+            (datetime(2025, 1, 1, 0, tzinfo=timezone.utc), 100.5, 7.25),
+            (datetime(2025, 1, 1, 1, tzinfo=timezone.utc), None, 8.0),
+        ]
+        self.series = to_columns(rows, ['active_power_mean', 'wind_speed_mean'])
+
+    def test_to_columns_empty(self):
+        self.assertEqual(to_columns([], ['active_power_mean']), {'time': [], 'active_power_mean': []})
+
+    def test_rows_layout(self):
+        data = json.loads(TimeseriesJSONRenderer().render(self.series))
+        self.assertEqual(data[0], {
+            'time': '2025-01-01T00:00:00Z',
+            'active_power_mean': 100.5,
+            'wind_speed_mean': 7.25,
+        })
+        self.assertIsNone(data[1]['active_power_mean'])
+
+    def test_columnar_layout(self):
+        data = json.loads(ColumnarJSONRenderer().render(self.series))
+        self.assertEqual(data['time'], [1735689600000, 1735693200000])
+        self.assertEqual(data['active_power_mean'], [100.5, None])
+        self.assertEqual(data['wind_speed_mean'], [7.25, 8.0])
+
+    def test_non_series_passthrough(self):
+        data = json.loads(ColumnarJSONRenderer().render({'detail': 'Not found.'}))
+        self.assertEqual(data, {'detail': 'Not found.'})
+
+    def test_arrow_round_trip(self):
+        if pyarrow is None:
+            self.skipTest('pyarrow is not installed')
+        payload = ArrowRenderer().render(self.series)
+        table = pyarrow.ipc.open_stream(payload).read_all()
+        self.assertEqual(table.column_names, ['time', 'active_power_mean', 'wind_speed_mean'])
+        self.assertEqual(table.column('active_power_mean').to_pylist(), [100.5, None])
+        self.assertEqual(table.column('time').to_pylist()[1], self.series['time'][1])
+
+
+class TimeseriesExportTest(SimpleTestCase):
+    columns = ['time', 'node_id', 'power_output']
+
+    def batches(self):
+        start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        yield [(start, 1, 10.5), (start, 2, None)]
+        yield [(start.replace(minute=10), 1, 11.0)]
+
+    def test_csv_streams_one_chunk_per_batch(self):
+        chunks = list(stream_csv(self.batches(), self.columns))
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(b''.join(chunks).decode().splitlines(), [
+            'time,node_id,power_output',
+            '2025-01-01T00:00:00+00:00,1,10.5',
+            '2025-01-01T00:00:00+00:00,2,',
+            '2025-01-01T00:10:00+00:00,1,11.0',
+        ])
+
+    def test_parquet_writes_row_group_per_batch(self):
+        if pyarrow is None:
+            self.skipTest('pyarrow is not installed')
+        payload = b''.join(stream_parquet(self.batches(), self.columns))
+        parquet_file = pyarrow.parquet.ParquetFile(io.BytesIO(payload))
+        self.assertEqual(parquet_file.num_row_groups, 2)
+        table = parquet_file.read()
+        self.assertEqual(table.column('power_output').to_pylist(), [10.5, None, 11.0])
+        self.assertEqual(table.column('node_id').to_pylist(), [1, 2, 1])
+
+
+class DownsamplingTest(SimpleTestCase):
+    def setUp(self):
+        self.x = np.arange(10_000, dtype=np.float64)
+        self.y = np.sin(self.x / 300)
+        self.y[4321] = 50.0   # spike
+        self.y[7000] = -50.0  # dip
+
+    def test_lttb_keeps_extremes_and_endpoints(self):
+        indices = lttb_indices(self.x, self.y, 500)
+        self.assertEqual(len(indices), 500)
+        self.assertEqual(indices[0], 0)
+        self.assertEqual(indices[-1], 9999)
+        self.assertIn(4321, indices)
+        self.assertIn(7000, indices)
+
+    def test_m4_keeps_extremes(self):
+        indices = m4_indices(self.x, self.y, 400)
+        self.assertLessEqual(len(indices), 400)
+        self.assertIn(4321, indices)
+        self.assertIn(7000, indices)
+        self.assertTrue(np.all(np.diff(indices) > 0))
+
+    def test_missing_values_are_never_selected(self):
+        self.y[::2] = np.nan
+        for select in (lttb_indices, m4_indices):
+            indices = select(self.x, self.y, 200)
+            self.assertFalse(np.isnan(self.y[indices]).any())
+
+    def test_downsample_series(self):
+        start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        series = {
+            'time': [start + timedelta(minutes=10 * i) for i in range(5000)],
+            'power_output': [float(v) for v in self.y[:5000]],
+            'module_temperature': [None] * 5000,
+        }
+        result = downsample(series, 1000, 'lttb')
+        self.assertLessEqual(len(result['time']), 1000)
+        self.assertEqual(len(result['time']), len(result['power_output']))
+        self.assertIn(50.0, result['power_output'])
+        self.assertIs(downsample(series, 10_000), series)
+
+    def series(self, fields, length=5000):
+        start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        return {
+            'time': [start + timedelta(minutes=10 * i) for i in range(length)],
+            **{field: [float(v) for v in self.y[:length] * (n + 1)] for n, field in enumerate(fields)},
+        }
+
+    def test_many_fields_stay_within_max_points(self):
+        fields = WindFarmTimeseries.measurement_fields()
+        series = self.series(fields)
+        for method in DOWNSAMPLING_METHODS:
+            result = downsample(series, minimum_points(len(fields)), method)
+            self.assertLessEqual(len(result['time']), minimum_points(len(fields)))
+        with self.assertRaises(ValueError):
+            downsample(series, 10)
+
+        serializer = TimeseriesQuerySerializer(
+            data=QueryDict('max_points=10'), context={'model': WindFarmTimeseries}
+        )
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('max_points', serializer.errors)
+
+    def test_gaps_survive_downsampling(self):
+        series = self.series(['power_output', 'module_temperature'])
+        for field in ('power_output', 'module_temperature'):
+            series[field][2000:2100] = [None] * 100  # explicit null buckets
+        for method in DOWNSAMPLING_METHODS:
+            result = downsample(series, 300, method)
+            self.assertLessEqual(len(result['time']), 300)
+            gap = result['time'].index(series['time'][2000])
+            self.assertIsNone(result['power_output'][gap])
+            self.assertIsNone(result['module_temperature'][gap])
+
+
+class BatchQuerySerializerTest(SimpleTestCase):
+    context = {'models': {'wind': WindFarmTimeseries, 'solar': SolarFarmTimeseries}}
+
+    def test_selectors_keyed_by_position_by_default(self):
+        serializer = BatchQuerySerializer(data={'selectors': [
+            {'farm_type': 'wind', 'farm_id': 1, 'field': 'active_power_mean'},
+            {'id': 'desert', 'farm_type': 'solar', 'farm_id': 2, 'nodes': [1], 'field': 'power_output'},
+        ]}, context=self.context)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual([s['id'] for s in serializer.validated_data['selectors']], ['0', 'desert'])
+
+    def test_field_must_exist_on_farm_type(self):
+        serializer = BatchQuerySerializer(data={'selectors': [
+            {'farm_type': 'solar', 'farm_id': 2, 'field': 'active_power_mean'},
+        ]}, context=self.context)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('selectors', serializer.errors)
+
+
+class GapfillQueryTest(SimpleTestCase):
+    def test_fill_implies_gapfill(self):
+        serializer = TimeseriesQuerySerializer(
+            data=QueryDict('fill=active_power_mean:interpolate,wind_speed_mean:locf'),
+            context={'model': WindFarmTimeseries},
+        )
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertTrue(serializer.validated_data['gapfill'])
+        self.assertEqual(serializer.validated_data['fill'], {
+            'active_power_mean': 'interpolate',
+            'wind_speed_mean': 'locf',
+        })
+
+    def test_gapfill_sql(self):
+        start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        window = (start, start + timedelta(days=1))
+        queryset = WindFarmTimeseries.timescale.for_farm(1).in_range(*window).bucketed(
+            '1 hour', ['active_power_mean'], gapfill_window=window,
+            fill={'active_power_mean': 'interpolate'},
+        )
+        sql = str(queryset.query)
+        self.assertIn('time_bucket_gapfill(', sql)
+        self.assertIn('interpolate((AVG(', sql)
+
+
+class LiveHubTest(SimpleTestCase):
+    def alarm(self, farm, alarm_id):
+        return json.dumps({'type': 'alarm', 'farm': farm, 'alarm_id': alarm_id})
+
+    async def test_fan_out_to_subscribed_farms(self):
+        hub = LiveHub(queue_size=10)
+        wind = hub.subscribe({'wind:1'})
+        both = hub.subscribe({'wind:1', 'solar:2'})
+        hub.dispatch(self.alarm('wind:1', 1))
+        hub.dispatch(self.alarm('solar:2', 2))
+        message = encode_event('alarm', {'farm': 'wind:1', 'alarm_id': 1})
+        self.assertEqual(wind.queue.get_nowait(), message)
+        self.assertEqual(
+            [both.queue.get_nowait(), both.queue.get_nowait()],
+            [message, encode_event('alarm', {'farm': 'solar:2', 'alarm_id': 2})],
+        )
+        self.assertTrue(wind.queue.empty())
+
+        hub.unsubscribe(wind)
+        hub.unsubscribe(both)
+        self.assertEqual(hub.subscriber_count, 0)
+
+    async def test_slow_client_drops_oldest(self):
+        hub = LiveHub(queue_size=2)
+        subscription = hub.subscribe({'wind:1'})
+        for alarm_id in (1, 2, 3):
+            hub.dispatch(self.alarm('wind:1', alarm_id))
+        self.assertEqual(subscription.dropped, 1)
+        self.assertEqual(
+            [json.loads((await subscription.get()).decode().split('data: ')[1]) for _ in range(2)],
+            [{'farm': 'wind:1', 'alarm_id': 2}, {'farm': 'wind:1', 'alarm_id': 3}],
+        )
+
+    async def test_pending_batches_coalesce(self):
+        hub = LiveHub()
+        subscription = hub.subscribe({'wind:1'})
+        hub.dispatch('{"type":"timeseries","farm":"wind:1","rows":2,"nodes":[3,4],'
+                     '"start":"2025-01-01T00:10:00Z","end":"2025-01-01T00:20:00Z"}')
+        hub.dispatch('{"type":"timeseries","farm":"wind:1","rows":5,"nodes":[1,2],'
+                     '"start":"2025-01-01T00:00:00.500Z","end":"2025-01-01T00:30:00Z"}')
+        self.assertEqual(subscription.queue.qsize(), 1)
+        message = (await subscription.get()).decode()
+        self.assertTrue(message.startswith('event: timeseries\n'))
+        self.assertEqual(json.loads(message.split('data: ')[1]), {
+            'farm': 'wind:1', 'rows': 7, 'nodes': [1, 4],
+            'start': '2025-01-01T00:00:00.500Z', 'end': '2025-01-01T00:30:00Z',
+        })
+
+
+class LiveNotifyTest(TransactionTestCase):
+    async def test_committed_batch_reaches_listener(self):
+        hub = LiveHub()
+        listener = NotificationListener(hub)
+        subscription = hub.subscribe({'wind:1'})
+        listener.ensure_running()
+        await asyncio.wait_for(listener.ready.wait(), 5)
+
+        start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        rows = [WindFarmTimeseries(farm_id=1, node_id=n, time=start) for n in (1, 2)]
+
+        def ingest(commit):
+            with transaction.atomic():
+                notify_timeseries_batch(WindFarmTimeseries, 1, rows)
+                if not commit:
+                    transaction.set_rollback(True)
+
+        await sync_to_async(ingest)(commit=False)
+        await sync_to_async(ingest)(commit=True)
+        message = await asyncio.wait_for(subscription.get(), 5)
+        listener._task.cancel()
+
+        self.assertIn(b'"rows":2', message)
+        self.assertTrue(subscription.queue.empty())
+
+
+class AsyncTimeseriesViewTest(SimpleTestCase):
+    async def test_requires_authentication(self):
+        response = await self.async_client.get('/api/timeseries/wind/1/async/')
+        self.assertEqual(response.status_code, 401)
+
+
+class SyntheticSeriesTest(SimpleTestCase):
+    wind_farm = {
+        'type': 'wind', 'id': 1, 'mean_speed': 8.0, 'rated_power': 2000.0,
+        'cut_in': 3.0, 'cut_out': 25.0,
+        'curve_speeds': [3, 6, 9, 12], 'curve_power': [0, 500, 1650, 2000],
+    }
+    solar_farm = {
+        'type': 'solar', 'id': 1, 'latitude': 40.5, 'longitude': -7.5,
+        'node_capacity': 1000.0, 'temp_coefficient': -0.0035, 'noct': 45.0,
+    }
+    start = datetime(2025, 6, 21, tzinfo=timezone.utc)
+
+    def test_wind_is_reproducible_and_follows_power_curve(self):
+        series = wind_node_series(self.wind_farm, 3, 7, self.start, 52560, 600)
+        again = wind_node_series(self.wind_farm, 3, 7, self.start, 52560, 600)
+        np.testing.assert_array_equal(series['active_power_mean'], again['active_power_mean'])
+        self.assertAlmostEqual(series['wind_speed_mean'].mean(), 8.0, delta=1.0)
+        self.assertLessEqual(series['active_power_mean'].max(), 2000.0)
+        self.assertTrue(np.all(np.diff(series['energy_accumulated']) >= 0))
+
+    def test_solar_follows_the_sun(self):
+        series = solar_node_series(self.solar_farm, 1, 7, self.start, 144, 600)
+        irradiance = series['solar_irradiance']
+        self.assertEqual(irradiance[:24].max(), 0)  # before 04:00 UTC
+        self.assertGreater(irradiance[72:84].mean(), 400)  # around noon
+
+
+class TimeRangeFilterTest(SimpleTestCase):
+    def test_limits_rows_to_default_window(self):
+        request = RequestFactory().get('/admin/timeseries/windfarmtimeseries/')
+        start = TimeRangeFilter.start(request)
+        self.assertAlmostEqual(
+            start, datetime.now(timezone.utc) - timedelta(hours=24), delta=timedelta(seconds=5)
+        )
+        time_filter = TimeRangeFilter(request, {}, WindFarmTimeseries, None)
+        self.assertEqual(time_filter.value(), '24h')
+        queryset = time_filter.queryset(request, WindFarmTimeseries.objects.all())
+        self.assertIn('"time" >=', str(queryset.query))
+
+    def test_rejects_unknown_range(self):
+        request = RequestFactory().get('/admin/timeseries/windfarmtimeseries/', {'range': 'all'})
+        with self.assertRaises(IncorrectLookupParameters):
+            TimeRangeFilter.start(request)
+
+
+class AlarmQuerySerializerTest(SimpleTestCase):
+    def test_parses_farms_and_cursor(self):
+        time_on = datetime(2025, 3, 1, 12, 30, 15, 250000, tzinfo=timezone(timedelta(hours=1)))
+        params = AlarmQuerySerializer(data=QueryDict(
+            f'farms=wind:1,solar:3&active=true&cursor={encode_cursor(time_on, 42)}'
+        ))
+        self.assertTrue(params.is_valid(), params.errors)
+        query = params.validated_data
+        self.assertEqual(query['farms'], [('wind', 1), ('solar', 3)])
+        self.assertTrue(query['active'])
+        self.assertEqual(query['cursor'], (time_on, 42))
+        self.assertEqual(query['limit'], 100)
+
+    def test_rejects_invalid_farm_and_cursor(self):
+        params = AlarmQuerySerializer(data=QueryDict('farms=hydro:1&cursor=yesterday_1'))
+        self.assertFalse(params.is_valid())
+        self.assertEqual(set(params.errors), {'farms', 'cursor'})
+
+    def test_keyset_continues_below_cursor(self):
+        time_on = datetime(2025, 3, 1, tzinfo=timezone.utc)
+        sql = str(Alarm.objects.active().newest_first((time_on, 42)).query)
+        self.assertIn('"time_off" IS NULL', sql)
+        self.assertIn('ORDER BY "timeseries_alarm"."time_on" DESC, "timeseries_alarm"."id" DESC', sql)
+
+
+class TimeseriesAPITestCase(TestCase):
+    """
+    Two companies with a wind and a solar farm each, and an API client
+    authenticated as a user of the first company.
+    """
+
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    @classmethod
+    def setUpTestData(cls):
+        helper = CreateTestDataCommand(stdout=io.StringIO())
+        companies = helper.create_companies()
+        wind_farms, solar_farms = helper.create_farms(
+            companies, helper.create_turbine_models(), helper.create_panel_models()
+        )
+        # create_farms alternates companies: index 0 is ours, 1 another's.
+        cls.wind_farm, cls.other_wind_farm = wind_farms
+        cls.solar_farm, cls.other_solar_farm = solar_farms
+        cls.user = CustomUser.objects.create_user(
+            username='operator', password='password123', company=companies[0]
+        )
+
+    def setUp(self):
+        token = CompanyRefreshToken.for_user(self.user).access_token
+        headers = {'Authorization': f'Bearer {token}'}
+        self.client = self.client_class(headers=headers)
+        self.async_client = self.async_client_class(headers=headers)
+
+    def add_wind_rows(self, farm, rows):
+        """Insert `(minutes after start, node_id, active_power_mean)` rows."""
+        WindFarmTimeseries.objects.bulk_create([
+            WindFarmTimeseries(
+                farm=farm, node_id=node_id, time=self.start + timedelta(minutes=minutes),
+                active_power_mean=power,
+            )
+            for minutes, node_id, power in rows
+        ])
+
+    def query(self, **params):
+        return {
+            'start': self.start.isoformat(),
+            'end': (self.start + timedelta(hours=3)).isoformat(),
+            'interval': '1 hour',
+            'fields': 'active_power_mean',
+            **params,
+        }
+
+
+class FarmTimeseriesViewTest(TimeseriesAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.add_wind_rows(self.wind_farm, [
+            (0, 1, 100), (10, 2, 200), (60, 1, 300), (150, 2, None),
+        ])
+        self.url = f'/api/timeseries/wind/{self.wind_farm.id}/'
+
+    def test_bucket_averages(self):
+        response = self.client.get(self.url, self.query())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [
+            {'time': '2025-01-01T00:00:00Z', 'active_power_mean': 150.0},
+            {'time': '2025-01-01T01:00:00Z', 'active_power_mean': 300.0},
+            {'time': '2025-01-01T02:00:00Z', 'active_power_mean': None},
+        ])
+
+    def test_columnar_and_arrow_formats(self):
+        data = self.client.get(self.url, self.query(format='columnar')).json()
+        self.assertEqual(data['active_power_mean'], [150.0, 300.0, None])
+        self.assertEqual(data['time'][0], 1735689600000)
+        if pyarrow is None:
+            return
+        response = self.client.get(self.url, self.query(format='arrow'))
+        table = pyarrow.ipc.open_stream(response.content).read_all()
+        self.assertEqual(table.column('active_power_mean').to_pylist(), [150.0, 300.0, None])
+
+    def test_other_company_farm_is_not_found(self):
+        self.add_wind_rows(self.other_wind_farm, [(0, 1, 999)])
+        for url in (
+            f'/api/timeseries/wind/{self.other_wind_farm.id}/',
+            f'/api/timeseries/wind/{self.other_wind_farm.id}/export/',
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url, self.query()).status_code, 404)
+
+    def test_requires_authentication(self):
+        response = self.client_class().get(self.url, self.query())
+        self.assertEqual(response.status_code, 401)
+
+
+class GapfillViewTest(TimeseriesAPITestCase):
+    def setUp(self):
+        super().setUp()
+        # Data in the first and third hour only.
+        self.add_wind_rows(self.wind_farm, [(0, 1, 100), (120, 1, 300)])
+        self.url = f'/api/timeseries/wind/{self.wind_farm.id}/'
+
+    def values(self, **params):
+        end = (self.start + timedelta(hours=4)).isoformat()
+        response = self.client.get(self.url, self.query(end=end, format='columnar', **params))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data['time']), 4)
+        return data['active_power_mean']
+
+    def test_gapfill_returns_every_bucket(self):
+        self.assertEqual(self.values(gapfill='true'), [100.0, None, 300.0, None])
+
+    def test_fill_methods(self):
+        self.assertEqual(self.values(fill='active_power_mean:locf'), [100.0, 100.0, 300.0, 300.0])
+        self.assertEqual(self.values(fill='active_power_mean:interpolate'), [100.0, 200.0, 300.0, None])
+
+
+class LiveUpdatesViewTest(TimeseriesAPITestCase):
+    url = '/api/timeseries/live-updates/'
+
+    async def test_other_company_farm_is_not_found(self):
+        with mock.patch('timeseries.views.listener') as listener:
+            for farms in (
+                f'wind:{self.other_wind_farm.id}',
+                f'wind:{self.wind_farm.id},solar:{self.other_solar_farm.id}',
+            ):
+                with self.subTest(farms=farms):
+                    response = await self.async_client.get(self.url, {'farms': farms})
+                    self.assertEqual(response.status_code, 404)
+        listener.ensure_running.assert_not_called()
+
+
+class BatchTimeseriesViewTest(TimeseriesAPITestCase):
+    url = '/api/timeseries/batch/'
+
+    def setUp(self):
+        super().setUp()
+        self.add_wind_rows(self.wind_farm, [(0, 1, 100), (10, 2, 200), (60, 1, 300)])
+        SolarFarmTimeseries.objects.bulk_create([
+            SolarFarmTimeseries(
+                farm=self.solar_farm, node_id=node_id, time=self.start + timedelta(minutes=minutes),
+                solar_irradiance=800, power_output=power, module_temperature=40,
+            )
+            for minutes, node_id, power in [(0, 1, 50), (60, 1, 70), (0, 2, 1000)]
+        ])
+
+    def batch(self, selectors):
+        query = self.query()
+        del query['fields']
+        return self.client.post(self.url, {**query, 'selectors': selectors}, content_type='application/json')
+
+    def test_union_results_grouped_by_selector(self):
+        response = self.batch([
+            {'id': 'coastal', 'farm_type': 'wind', 'farm_id': self.wind_farm.id, 'field': 'active_power_mean'},
+            {'id': 'desert', 'farm_type': 'solar', 'farm_id': self.solar_farm.id, 'nodes': [1], 'field': 'power_output'},
+            {'farm_type': 'wind', 'farm_id': self.wind_farm.id, 'nodes': [9], 'field': 'active_power_mean'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], {
+            'coastal': {
+                'time': ['2025-01-01T00:00:00Z', '2025-01-01T01:00:00Z'],
+                'active_power_mean': [150.0, 300.0],
+            },
+            'desert': {
+                'time': ['2025-01-01T00:00:00Z', '2025-01-01T01:00:00Z'],
+                'power_output': [50.0, 70.0],
+            },
+            '2': {'time': [], 'active_power_mean': []},
+        })
+
+    def test_other_company_farm_is_not_found(self):
+        self.add_wind_rows(self.other_wind_farm, [(0, 1, 999)])
+        response = self.batch([
+            {'farm_type': 'wind', 'farm_id': self.wind_farm.id, 'field': 'active_power_mean'},
+            {'farm_type': 'wind', 'farm_id': self.other_wind_farm.id, 'field': 'active_power_mean'},
+        ])
+        self.assertEqual(response.status_code, 404)
+
+
+class AlarmFarmPrefetchTest(TimeseriesAPITestCase):
+    """Listing alarms with their farms costs the same queries for any number of alarms."""
+
+    def set_alarm_count(self, total):
+        farms = [
+            (ContentType.objects.get_for_model(type(farm)), farm)
+            for farm in (self.wind_farm, self.solar_farm)
+        ]
+        alarms = []
+        for i in range(Alarm.objects.count(), total):
+            content_type, farm = farms[i % 2]
+            alarms.append(Alarm(
+                content_type=content_type, farm_id=farm.id, alarm_id=i, alarm_code='E1',
+                node_id=1, time_on=self.start + timedelta(minutes=i),
+            ))
+        Alarm.objects.bulk_create(alarms)
+
+    def test_serializer_queries_do_not_grow(self):
+        for total in (2, 50):
+            self.set_alarm_count(total)
+            # Alarms with their content types, then wind and solar farms.
+            with self.subTest(alarms=total), self.assertNumQueries(3):
+                data = AlarmSerializer(Alarm.objects.with_farms(), many=True).data
+            self.assertEqual(len(data), total)
+            self.assertEqual(
+                {alarm['farm_name'] for alarm in data}, {self.wind_farm.name, self.solar_farm.name}
+            )
+
+    def test_admin_farm_column_queries_do_not_grow(self):
+        model_admin = AlarmAdmin(Alarm, admin.site)
+        request = RequestFactory().get('/admin/timeseries/alarm/')
+        for total in (2, 50):
+            self.set_alarm_count(total)
+            with self.subTest(alarms=total), self.assertNumQueries(3):
+                names = [model_admin.farm(alarm) for alarm in model_admin.get_queryset(request)]
+            self.assertEqual(len(names), total)
+
+
+class AlarmListViewTest(TimeseriesAPITestCase):
+    url = '/api/timeseries/alarms/'
+
+    def setUp(self):
+        super().setUp()
+        wind, solar = (ContentType.objects.get_for_model(model) for model in (WindFarm, SolarFarm))
+        # Three alarms share a time_on, so only the id orders them.
+        alarms = Alarm.objects.bulk_create([
+            Alarm(
+                content_type=content_type, farm_id=farm.id, alarm_id=alarm_id,
+                alarm_code='E1', node_id=1, time_on=self.start + timedelta(minutes=minutes),
+            )
+            for content_type, farm, alarm_id, minutes in [
+                (wind, self.wind_farm, 1, 0),
+                (wind, self.wind_farm, 2, 30),
+                (solar, self.solar_farm, 3, 30),
+                (wind, self.wind_farm, 4, 30),
+                (wind, self.wind_farm, 5, 60),
+                (wind, self.other_wind_farm, 6, 30),
+                (solar, self.other_solar_farm, 7, 90),
+            ]
+        ])
+        self.own_ids = [alarm.pk for alarm in sorted(
+            alarms[:5], key=lambda alarm: (alarm.time_on, alarm.pk), reverse=True
+        )]
+
+    def test_pages_by_keyset_without_skips_or_repeats(self):
+        ids, pages, cursor = [], 0, None
+        while True:
+            params = {'limit': 2, **({'cursor': cursor} if cursor else {})}
+            data = self.client.get(self.url, params).json()
+            ids += [alarm['id'] for alarm in data['results']]
+            pages += 1
+            cursor = data['next']
+            if cursor is None:
+                break
+        self.assertEqual(ids, self.own_ids)
+        self.assertEqual(pages, 3)
+
+    def test_other_company_alarms_are_excluded(self):
+        response = self.client.get(self.url, {'farms': f'wind:{self.other_wind_farm.id}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [])
+        all_ids = [alarm['id'] for alarm in self.client.get(self.url).json()['results']]
+        self.assertEqual(all_ids, self.own_ids)
+
+
+class ExportTimeseriesViewTest(TimeseriesAPITestCase):
+    csv_lines = [
+        'time,node_id,active_power_mean',
+        '2025-01-01T00:00:00+00:00,1,100.0',
+        '2025-01-01T00:00:00+00:00,2,',
+        '2025-01-01T00:10:00+00:00,1,110.5',
+        '2025-01-01T00:10:00+00:00,2,120.0',
+        '2025-01-01T00:20:00+00:00,1,130.0',
+    ]
+
+    def setUp(self):
+        super().setUp()
+        self.add_wind_rows(self.wind_farm, [
+            (0, 1, 100), (0, 2, None), (10, 1, 110.5), (10, 2, 120), (20, 1, 130),
+        ])
+        self.url = f'/api/timeseries/wind/{self.wind_farm.id}/export/'
+        # Two rows per batch, so five rows stream as three chunks.
+        patcher = mock.patch('timeseries.views.iter_batches', partial(iter_batches, batch_size=2))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_csv_streams_batches(self):
+        response = self.client.get(self.url, self.query())
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertFalse(response.is_async)
+        chunks = list(response.streaming_content)
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(b''.join(chunks).decode().splitlines(), self.csv_lines)
+
+    async def test_asgi_streams_asynchronously(self):
+        response = await self.async_client.get(self.url, self.query())
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(b''.join(chunks).decode().splitlines(), self.csv_lines)
+
+    def test_parquet_contents(self):
+        if pyarrow is None:
+            self.skipTest('pyarrow is not installed')
+        response = self.client.get(self.url, self.query(format='parquet'))
+        self.assertEqual(response['Content-Type'], 'application/vnd.apache.parquet')
+        parquet_file = pyarrow.parquet.ParquetFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(parquet_file.num_row_groups, 3)
+        table = parquet_file.read()
+        self.assertEqual(table.column('node_id').to_pylist(), [1, 2, 1, 2, 1])
+        self.assertEqual(
+            table.column('active_power_mean').to_pylist(), [100.0, None, 110.5, 120.0, 130.0]
+        )
+
+
+class CopyIngestNotifyTest(TimeseriesAPITestCase):
+    def test_copy_announces_one_batch(self):
+        columns = {'active_power_mean': np.array([1.0, 2.0, 3.0])}
+        with mock.patch('timeseries.synthetic.send_notification') as send_notification:
+            rows = copy_node_series(WindFarmTimeseries, self.wind_farm.id, 3, self.start, 600, columns)
+        self.assertEqual(rows, 3)
+        self.assertEqual(WindFarmTimeseries.objects.filter(farm=self.wind_farm).count(), 3)
+        send_notification.assert_called_once()
+        self.assertEqual(send_notification.call_args.args[0], {
+            'type': 'timeseries', 'farm': f'wind:{self.wind_farm.id}', 'rows': 3, 'nodes': [3, 3],
+            'start': self.start, 'end': self.start + timedelta(minutes=20),
+        })
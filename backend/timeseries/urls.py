@@ -0,0 +1,11 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('live-updates/', views.live_updates, name='timeseries-live-updates'),
+    path('batch/', views.batch_timeseries, name='timeseries-batch'),
+    path('alarms/', views.alarm_list, name='alarm-list'),
+    path('<str:farm_type>/<int:farm_id>/', views.farm_timeseries, name='farm-timeseries'),
+    path('<str:farm_type>/<int:farm_id>/async/', views.farm_timeseries_async, name='farm-timeseries-async'),
+    path('<str:farm_type>/<int:farm_id>/export/', views.export_timeseries, name='farm-timeseries-export'),
+]
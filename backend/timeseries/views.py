@@ -1,3 +1,351 @@
-from django.shortcuts import render
+from collections import defaultdict
+from itertools import groupby
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, get_object_or_404
+from django.views.decorators.http import require_GET
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.request import Request
+from rest_framework.response import Response
+from core.authentication import async_authentication_required
+from core.db import read_alias, run_cancellable
+from farms.models import WindFarm, SolarFarm
+from .models import Alarm, WindFarmTimeseries, SolarFarmTimeseries
+from .downsampling import downsample
+from .export import EXPORT_FORMATS, iter_batches, iterate_async
+from .live import farm_key, hub, listener
+from .renderers import EXPORT_RENDERERS, TIMESERIES_RENDERERS
+from .serializers import (
+    AlarmQuerySerializer,
+    AlarmSerializer,
+    BatchQuerySerializer,
+    TimeseriesQuerySerializer,
+    TimeseriesRangeSerializer,
+    encode_cursor,
+)
+from .series import to_columns
 
-# Create your views here.
+FARM_MODELS = {
+    'wind': (WindFarm, WindFarmTimeseries),
+    'solar': (SolarFarm, SolarFarmTimeseries),
+}
+
+
+def get_farm_models(farm_type):
+    """Return the (farm, timeseries) model pair for a farm type or raise 404."""
+    try:
+        return FARM_MODELS[farm_type]
+    except KeyError:
+        raise Http404(f"Unknown farm type: {farm_type}")
+
+
+def company_farms(farm_model, user):
+    """
+    Farms of `farm_model` that `user` may read: those of their company.
+    Other companies' farms answer 404 as if they didn't exist.
+    """
+    return farm_model.objects.filter(company_id=user.company_id)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes(TIMESERIES_RENDERERS)
+def farm_timeseries(request, farm_type, farm_id):
+    """
+    Get bucketed timeseries data for one farm.
+    Query params:
+    - start, end: Optional ISO 8601 range (defaults to the last 24 hours)
+    - interval: Optional bucket width, e.g. '10 minutes', '1 hour', '1 day'
+    - fields: Optional comma-separated measurement fields (defaults to all)
+    - nodes: Optional comma-separated node ids
+    - max_points: Optional cap on returned timestamps; larger results are
+      downsampled with `downsample` ('lttb', default, or 'm4'), which keeps
+      peaks and troughs instead of averaging them away
+    - gapfill: Optional 'true' to return every bucket of the range, with
+      explicit nulls where no data was recorded
+    - fill: Optional comma-separated `field:method` pairs filling those gaps
+      in the database with 'locf' or 'interpolate' (implies gapfill)
+
+    The response format is negotiated from the Accept header or `?format=`:
+    rows (`json`, default), one array per field (`columnar`) or Arrow IPC (`arrow`).
+    """
+    farm_model, timeseries_model = get_farm_models(farm_type)
+    farm = get_object_or_404(company_farms(farm_model, request.user), pk=farm_id)
+
+    params = TimeseriesQuerySerializer(
+        data=request.query_params, context={'model': timeseries_model}
+    )
+    params.is_valid(raise_exception=True)
+
+    return Response(
+        query_farm_series(timeseries_model, farm.id, params.validated_data, read_alias())
+    )
+
+
+@require_GET
+@async_authentication_required
+async def farm_timeseries_async(request, farm_type, farm_id):
+    """
+    Async variant of `farm_timeseries`, taking the same query params and
+    negotiating the same formats. Serve it under ASGI: the query runs
+    through `run_cancellable`, so PostgreSQL stops working on it as soon
+    as the client disconnects.
+    """
+    farm_model, timeseries_model = get_farm_models(farm_type)
+    try:
+        renderer, media_type = DefaultContentNegotiation().select_renderer(
+            Request(request), [renderer() for renderer in TIMESERIES_RENDERERS]
+        )
+    except NotAcceptable as exc:
+        return JsonResponse({'detail': exc.detail}, status=exc.status_code)
+
+    params = TimeseriesQuerySerializer(data=request.GET, context={'model': timeseries_model})
+    if not params.is_valid():
+        return JsonResponse(params.errors, status=400)
+    farm = await aget_object_or_404(company_farms(farm_model, request.user), pk=farm_id)
+
+    using = await sync_to_async(read_alias)()
+    series = await run_cancellable(
+        query_farm_series, timeseries_model, farm.id, params.validated_data, using,
+        using=using,
+    )
+    content_type = media_type
+    if renderer.charset:
+        content_type = f'{media_type}; charset={renderer.charset}'
+    return HttpResponse(renderer.render(series, media_type), content_type=content_type)
+
+
+def query_farm_series(timeseries_model, farm_id, query, using):
+    """Run a validated `TimeseriesQuerySerializer` query for one farm."""
+    window = (query['start'], query['end'])
+    rows = (
+        timeseries_model.timescale.db_manager(using)
+        .for_farm(farm_id, query.get('nodes'))
+        .in_range(*window)
+        .bucketed(
+            query['interval'],
+            query['fields'],
+            gapfill_window=window if query['gapfill'] else None,
+            fill=query.get('fill'),
+        )
+    )
+
+    series = to_columns(rows, query['fields'])
+    if 'max_points' in query:
+        series = downsample(series, query['max_points'], query['downsample'])
+    return series
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def batch_timeseries(request):
+    """
+    Fetch one bucketed field for many farms/node sets in a single SQL query.
+
+    Example request:
+    ```json
+    {
+        "start": "2025-01-01T00:00:00Z",
+        "end": "2025-01-02T00:00:00Z",
+        "interval": "1 hour",
+        "max_points": 500,
+        "gapfill": false,
+        "selectors": [
+            {"id": "coastal", "farm_type": "wind", "farm_id": 1, "field": "active_power_mean", "fill": "locf"},
+            {"id": "desert", "farm_type": "solar", "farm_id": 3, "nodes": [1, 2], "field": "power_output"}
+        ]
+    }
+    ```
+
+    `gapfill` returns every bucket of the range for all selectors; a
+    selector `fill` ('locf' or 'interpolate') gapfills just that selector.
+
+    Every selected farm must belong to the user's company, otherwise the
+    whole request answers 404.
+
+    Returns one columnar series per selector id (selectors without an id
+    are keyed by position). Selectors that match no rows get empty arrays:
+    ```json
+    {"results": {"coastal": {"time": [...], "active_power_mean": [...]}, "desert": {...}}}
+    ```
+    """
+    timeseries_models = {
+        farm_type: timeseries_model
+        for farm_type, (_, timeseries_model) in FARM_MODELS.items()
+    }
+    params = BatchQuerySerializer(data=request.data, context={'models': timeseries_models})
+    params.is_valid(raise_exception=True)
+    query = params.validated_data
+    selectors = query['selectors']
+    for farm_type, (farm_model, _) in FARM_MODELS.items():
+        farm_ids = {selector['farm_id'] for selector in selectors if selector['farm_type'] == farm_type}
+        if farm_ids and company_farms(farm_model, request.user).filter(pk__in=farm_ids).count() < len(farm_ids):
+            raise Http404
+
+    window = (query['start'], query['end'])
+    using = read_alias()
+    querysets = [
+        timeseries_models[selector['farm_type']].timescale.db_manager(using)
+        .for_farm(selector['farm_id'], selector.get('nodes'))
+        .in_range(*window)
+        .bucketed_field(
+            query['interval'],
+            selector['field'],
+            position,
+            gapfill_window=window if query['gapfill'] or 'fill' in selector else None,
+            fill=selector.get('fill'),
+        )
+        for position, selector in enumerate(selectors)
+    ]
+    combined = querysets[0].union(*querysets[1:], all=True).order_by('label', 'bucket')
+
+    rows_by_selector = {
+        position: [(bucket, value) for _, bucket, value in rows]
+        for position, rows in groupby(combined, key=lambda row: row[0])
+    }
+
+    results = {}
+    for position, selector in enumerate(selectors):
+        series = to_columns(rows_by_selector.get(position, []), [selector['field']])
+        if 'max_points' in query:
+            series = downsample(series, query['max_points'], query['downsample'])
+        results[selector['id']] = series
+
+    return Response({'results': results})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes(EXPORT_RENDERERS)
+def export_timeseries(request, farm_type, farm_id):
+    """
+    Stream raw (unbucketed) timeseries rows for one farm as a file download.
+    Query params:
+    - start, end: Optional ISO 8601 range (defaults to the last 24 hours)
+    - fields: Optional comma-separated measurement fields (defaults to all)
+    - nodes: Optional comma-separated node ids
+    - format: 'csv' (default) or 'parquet', also negotiable via the Accept header
+
+    Rows are read from a server-side cursor and written out batch by batch,
+    so exports of any size use constant memory. Under ASGI the response
+    iterates asynchronously (see `iterate_async`), as Django would otherwise
+    buffer the whole file before sending it.
+    """
+    farm_model, timeseries_model = get_farm_models(farm_type)
+    farm = get_object_or_404(company_farms(farm_model, request.user), pk=farm_id)
+
+    params = TimeseriesRangeSerializer(
+        data=request.query_params, context={'model': timeseries_model}
+    )
+    params.is_valid(raise_exception=True)
+    query = params.validated_data
+
+    rows = (
+        timeseries_model.timescale.db_manager(read_alias())
+        .for_farm(farm.id, query.get('nodes'))
+        .in_range(query['start'], query['end'])
+        .raw_rows(query['fields'])
+    )
+
+    export_format = request.accepted_renderer.format
+    encoder, content_type = EXPORT_FORMATS[export_format]
+    columns = ['time', 'node_id', *query['fields']]
+    content = encoder(iter_batches(rows), columns)
+    if isinstance(request._request, ASGIRequest):
+        content = iterate_async(content)
+    response = StreamingHttpResponse(content, content_type=content_type)
+    filename = (
+        f"{farm_type}-{farm.id}-{query['start']:%Y%m%d%H%M}-{query['end']:%Y%m%d%H%M}"
+        f".{export_format}"
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def alarm_list(request):
+    """
+    List alarms of the user's company's farms, newest first.
+    Query params:
+    - farms: Optional comma-separated `farm_type:farm_id` pairs, e.g. 'wind:1,solar:3'
+    - nodes: Optional comma-separated node ids
+    - codes: Optional comma-separated alarm codes
+    - active: Optional 'true' for alarms that have not cleared yet
+    - start, end: Optional ISO 8601 range of `time_on`
+    - limit: Optional page size (default 100, at most 1000)
+    - cursor: Optional `next` value of the previous page
+
+    Returns `{"results": [...], "next": cursor}`; `next` is null on the
+    last page. Pages continue from the `(time_on, id)` of the previous
+    one, so deep pages cost the same as the first.
+    """
+    params = AlarmQuerySerializer(data=request.query_params)
+    params.is_valid(raise_exception=True)
+    query = params.validated_data
+
+    alarms = Alarm.objects.using(read_alias()).for_company(request.user.company_id).with_farms()
+    if 'farms' in query:
+        alarms = alarms.for_farms(query['farms'])
+    if query.get('nodes'):
+        alarms = alarms.filter(node_id__in=query['nodes'])
+    if query.get('codes'):
+        alarms = alarms.filter(alarm_code__in=query['codes'])
+    if query['active']:
+        alarms = alarms.active()
+    if 'start' in query:
+        alarms = alarms.filter(time_on__gte=query['start'])
+    if 'end' in query:
+        alarms = alarms.filter(time_on__lt=query['end'])
+
+    # One extra row tells whether there is a next page.
+    limit = query['limit']
+    page = list(alarms.newest_first(query.get('cursor'))[:limit + 1])
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_cursor(page[-1].time_on, page[-1].pk)
+    return Response({'results': AlarmSerializer(page, many=True).data, 'next': next_cursor})
+
+
+@require_GET
+@async_authentication_required
+async def live_updates(request):
+    """
+    Server-Sent Events stream of new timeseries points and alarm changes.
+    Query params:
+    - farms: Comma-separated `farm_type:farm_id` subscriptions, e.g. 'wind:1,solar:3'.
+      Every farm must belong to the user's company, otherwise the request
+      answers 404.
+
+    Emits `timeseries` summaries (farm, node range and time range to
+    refetch) and `alarm` events as ingest transactions commit (see
+    `timeseries.live`), plus a heartbeat comment every few seconds.
+    Must be served by an ASGI server; under WSGI each client ties up a worker.
+    """
+    farm_ids = defaultdict(set)
+    for subscription in filter(None, request.GET.get('farms', '').split(',')):
+        farm_type, _, farm_id = subscription.strip().partition(':')
+        if farm_type not in FARM_MODELS or not farm_id.isdigit():
+            return JsonResponse({'farms': [f'Invalid subscription: {subscription}']}, status=400)
+        farm_ids[farm_type].add(int(farm_id))
+    if not farm_ids:
+        return JsonResponse({'farms': ['Subscribe to at least one farm.']}, status=400)
+
+    keys = set()
+    for farm_type, ids in farm_ids.items():
+        farms = company_farms(FARM_MODELS[farm_type][0], request.user).filter(pk__in=ids)
+        owned = [pk async for pk in farms.values_list('pk', flat=True)]
+        if len(owned) < len(ids):
+            raise Http404
+        keys.update(farm_key(farm_type, pk) for pk in owned)
+
+    listener.ensure_running()
+    response = StreamingHttpResponse(hub.stream(keys), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response